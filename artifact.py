@@ -0,0 +1,247 @@
+"""
+Compiled formulas : the clauses of a FormulaBuilderSkeleton encoded once and
+written to a file that any process maps and hands to a solver, without
+running the Python encoding again.
+
+    formula = compiled('formulas/', speed, durations, capacity=2, T=52)
+    satisfiable, schedule = solve_compiled(formula)
+
+File layout, native byte order (checked when loading), every section
+starting on 8 bytes :
+    header       magic, byte order mark, nvars, nclauses, nlits, natmosts,
+                 natmost_lits, meta size
+    offsets      int64[nclauses + 1]   clause i is lits[offsets[i]:offsets[i + 1]]
+    lits         int32[nlits]
+    atmost_offsets, bounds, atmost_lits    the same for the AtMostK constraints
+    meta         JSON : the builder parameters and the variable names
+load() maps the file read-only and reads the sections in place
+(memoryviews, no copy) : the workers mapping the same file share one copy
+in the page cache. The solver still takes the clauses one by one
+(pysat has no bulk API), but that is a loop over slices, not the encoding.
+
+to_dimacs / from_dimacs convert from and to DIMACS ("p cnf+" and "<= k"
+lines for the AtMostK, as pysat's CNFPlus), the builder parameters and the
+variable names going through "c meta <JSON>" and "c var <id> <JSON name>"
+comments that other tools skip.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pysat.card import EncType
+from pysat.formula import IDPool
+from pysat.solvers import Solver
+
+from attempt_3 import FormulaBuilderSkeleton
+from budget import Budget
+from schedule import Schedule
+from sinks import ArraySink, solver_for
+
+MAGIC = b'CHKFORM1'
+# reads 0x01020304 back only in the byte order it was written in
+BOM = 0x01020304
+HEADER = struct.Struct('=8s7q')
+# what the meta of compile_formula() keeps of the builder
+PARAMETERS = ('speed', 'durations', 'capacity', 'T', 'normal_form', 'card_encoding', 'prune', 'events')
+
+
+def _pad(f) -> None:
+    f.write(b'\0' * (-f.tell() % 8))
+
+
+def _name(obj) -> tuple:
+    # JSON gives the tuples of the pool back as lists
+    return tuple(_name(x) if isinstance(x, list) else x for x in obj)
+
+
+def write(sink: ArraySink, nvars: int, meta: dict, path: str) -> None:
+    """Writes the arrays of `sink` as a compiled formula, atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            blob = json.dumps(meta, separators=(',', ':')).encode()
+            f.write(HEADER.pack(MAGIC, BOM, nvars, sink.nclauses, len(sink.lits), sink.natmosts,
+                                len(sink.atmost_lits), len(blob)))
+            for section in (sink.offsets, sink.lits, sink.atmost_offsets, sink.bounds, sink.atmost_lits):
+                section.tofile(f)
+                _pad(f)
+            f.write(blob)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def compile_formula(fb: FormulaBuilderSkeleton, path: str) -> None:
+    """Builds fb (not built yet) straight into a compiled formula at `path`."""
+    sink = ArraySink()
+    fb.cnf = sink
+    fb.build_cnf()
+    meta = {name: getattr(fb, name) for name in PARAMETERS}
+    meta['durations'] = sorted(fb.durations.items())
+    meta['names'] = [[var, obj] for obj, var in fb.v.obj2id.items()]
+    write(sink, fb.v.top, meta, path)
+
+
+class CompiledFormula:
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, bom, self.nvars, self.nclauses, nlits, self.natmosts, natmost_lits, meta_size = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a compiled formula')
+        if bom != BOM:
+            raise ValueError(f'{path} was written on a machine of the other byte order ({sys.byteorder} here)')
+        sections = []
+        at = HEADER.size
+        for fmt, count in (('q', self.nclauses + 1), ('i', nlits), ('q', self.natmosts + 1),
+                           ('i', self.natmosts), ('i', natmost_lits)):
+            size = count * struct.calcsize(fmt)
+            sections.append(view[at:at + size].cast(fmt))
+            at += size + (-size % 8)
+        self.offsets, self.lits, self.atmost_offsets, self.bounds, self.atmost_lits = sections
+        self.meta = json.loads(bytes(view[at:at + meta_size]))
+        self._fb = None
+
+    def clauses(self) -> Iterator[List[int]]:
+        offsets, lits = self.offsets, self.lits
+        for i in range(self.nclauses):
+            yield lits[offsets[i]:offsets[i + 1]].tolist()
+
+    def atmosts(self) -> Iterator[Tuple[List[int], int]]:
+        offsets, lits = self.atmost_offsets, self.atmost_lits
+        for i in range(self.natmosts):
+            yield lits[offsets[i]:offsets[i + 1]].tolist(), self.bounds[i]
+
+    def names(self) -> Dict[int, tuple]:
+        """Variable -> name of the builder's pool (empty if the DIMACS had none)."""
+        return {var: _name(obj) for var, obj in self.meta.get('names', ())}
+
+    def feed(self, solver) -> None:
+        solver.append_formula(self.clauses())
+        for lits, bound in self.atmosts():
+            solver.add_atmost(lits, bound)
+
+    def decode(self, model: List[int]) -> Schedule:
+        """FormulaBuilderSkeleton.decode() of a model, with the stored names."""
+        if self._fb is None:
+            if 'durations' not in self.meta:
+                raise ValueError('No builder parameters in this formula, only a builder output decodes')
+            meta = self.meta
+            fb = FormulaBuilderSkeleton(speed=meta['speed'], durations=dict(meta['durations']),
+                                        capacity=meta['capacity'], T=meta['T'],
+                                        normal_form=meta['normal_form'],
+                                        card_encoding=meta['card_encoding'], prune=False,
+                                        events=meta['events'])
+            fb.v = IDPool()
+            for var, obj in self.names().items():
+                fb.v.obj2id[obj] = var
+                fb.v.id2obj[var] = obj
+            fb.v.top = self.nvars
+            self._fb = fb
+        return self._fb.decode(model)
+
+    def close(self) -> None:
+        self.offsets = self.lits = self.atmost_offsets = self.bounds = self.atmost_lits = None
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path: str) -> CompiledFormula:
+    return CompiledFormula(path)
+
+
+def compiled(directory: str, speed, durations: Dict[int, int], capacity: int, T: int,
+             normal_form: Optional[str] = None, card_encoding: int = EncType.seqcounter) -> CompiledFormula:
+    """
+    The compiled formula of these parameters in `directory`, compiled first
+    if no process did it yet (named after a hash of the parameters).
+    """
+    key = json.dumps([MAGIC.decode(), list(speed), sorted(durations.items()), capacity, T, normal_form,
+                      card_encoding])
+    path = os.path.join(directory, hashlib.sha1(key.encode()).hexdigest() + '.cnfbin')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        compile_formula(FormulaBuilderSkeleton(speed=speed, durations=durations, capacity=capacity, T=T,
+                                               normal_form=normal_form, card_encoding=card_encoding), path)
+    return load(path)
+
+
+def solve_compiled(formula: CompiledFormula, solver_name: str = 'g3', budget: Optional[Budget] = None):
+    """solve_streamed() of a compiled formula : (True, Schedule) or (False, None)."""
+    with Solver(name=solver_for(formula.natmosts > 0, solver_name)) as s:
+        formula.feed(s)
+        if s.solve() if budget is None else budget.solve(s):
+            return True, formula.decode(s.get_model())
+        return False, None
+
+
+def to_dimacs(formula: CompiledFormula, out) -> None:
+    """DIMACS text of `formula` into the open text file `out`."""
+    names = formula.names()
+    kind = 'cnf+' if formula.natmosts else 'cnf'
+    meta = {key: value for key, value in formula.meta.items() if key != 'names'}
+    if meta:
+        out.write(f'c meta {json.dumps(meta, separators=(",", ":"))}\n')
+    for var in sorted(names):
+        out.write(f'c var {var} {json.dumps(names[var], separators=(",", ":"))}\n')
+    out.write(f'p {kind} {formula.nvars} {formula.nclauses + formula.natmosts}\n')
+    for clause in formula.clauses():
+        out.write(' '.join(map(str, clause)))
+        out.write(' 0\n')
+    for lits, bound in formula.atmosts():
+        out.write(f'{" ".join(map(str, lits))} <= {bound}\n')
+
+
+def from_dimacs(lines, path: str) -> None:
+    """
+    Compiles DIMACS lines (an open file) to `path`. A clause may span
+    several lines, the parameters and names come from the "c meta" and
+    "c var" comments if any (to_dimacs writes them).
+    """
+    sink = ArraySink()
+    meta = {}
+    names = []
+    nvars = 0
+    clause = []
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if fields[0] == 'c':
+            if len(fields) > 3 and fields[1] == 'var':
+                names.append([int(fields[2]), json.loads(line.split(None, 3)[3])])
+            elif len(fields) > 2 and fields[1] == 'meta':
+                meta = json.loads(line.split(None, 2)[2])
+            continue
+        if fields[0] == 'p':
+            nvars = int(fields[2])
+            continue
+        if '<=' in fields:
+            lits = [int(x) for x in fields[:-2]]
+            sink.add_atmost(lits, int(fields[-1]))
+            nvars = max([nvars, *map(abs, lits)])
+            continue
+        for x in map(int, fields):
+            if x == 0:
+                sink.append(clause)
+                clause = []
+            else:
+                clause.append(x)
+                nvars = max(nvars, abs(x))
+    if clause:
+        raise ValueError('Last clause of the DIMACS is not terminated by 0')
+    write(sink, nvars, {**meta, 'names': names}, path)
@@ -1,16 +1,55 @@
 from pysat.formula import * 
 from pysat.solvers import *
 from pysat.card import *
+from pysat.examples.rc2 import RC2
 import itertools
+import logging
+import time
+import tracemalloc
+from budget import Budget
 from view import export_model_to_csv
+from schedule import Schedule, Trip
+from preprocess import Preprocessor
+from sinks import CountingSink, SolverSink, add_atmost, solver_for
 
 
 from typing import Dict, Iterable, List, Optional, Tuple
 
+log = logging.getLogger(__name__)
+
+
+class _PrunedPool(IDPool):
+    """
+    IDPool that never creates the variables the builder knows the value of :
+    id() returns the constant `false` (or -false for true) for them instead,
+    FormulaBuilderSkeleton.add_clause() then simplifies the clauses.
+    """
+    def __init__(self, fixed):
+        super().__init__()
+        self.fixed = fixed
+        self.false = super().id(("false",))
+
+    def id(self, obj=None):
+        if obj is not None and obj not in self.obj2id:
+            value = self.fixed(obj)
+            if value is not None:
+                return -self.false if value else self.false
+        return super().id(obj)
+
 
 class FormulaBuilderSkeleton:
+    # optional schedule normal forms, see add_normal_form()
+    NORMAL_FORMS = (None, "no_idle", "slack_end")
+    # defined from the other variables, see auxiliaries()
+    AUXILIARIES = ("hArrA", "hArrB", "DEP", "ARR")
+
     def __init__(self, speed, durations: Dict[int, int], capacity: int = 2, T: int = 18, P: int = 4,
-                    S: Iterable[str] = ("a", "r")):
+                    S: Iterable[str] = ("a", "r"), normal_form: Optional[str] = None, sink=None,
+                    card_encoding: int = EncType.seqcounter, instrument: bool = False,
+                    prune: bool = True, events: bool = True):
+        if normal_form not in self.NORMAL_FORMS:
+            raise ValueError(f"Unknown normal form {normal_form!r}, expected one of {self.NORMAL_FORMS}")
+        self.normal_form = normal_form
         self.durations = durations
         self.capacity = capacity
         self.speed = speed
@@ -18,38 +57,384 @@ class FormulaBuilderSkeleton:
         self.P = len(durations)
         self.S = tuple(S)
 
-        self.cnf = CNF()
-        self.v = IDPool()
+        # boat capacity encoding, EncType.native keeps it as AtMostK constraints
+        self.card_encoding = card_encoding
+        # anything with append/extend, see sinks.py
+        if sink is None:
+            sink = CNFPlus() if card_encoding == EncType.native else CNF()
+        self.cnf = sink
+        # the horizon the latest times of reachability() are computed for,
+        # only known in build_cnf() (extend_to() moves it)
+        self.hard_T = None
+        self.prune = prune
+        self.v = _PrunedPool(self._fixed) if prune else IDPool()
+        # only the event times get a layer, see event_times()
+        self.events = events
+        self._points = set()
+        self._previous = {}
+        self._following = {}
+        # last time layer already encoded (-1 : nothing built yet)
+        self.built_T = -1
+        # family name -> counters, see report() (None : not instrumented)
+        self.stats = {} if instrument else None
+        # per time step, (p, dep_a id, dep_r id) of every chicken, see decode()
+        self._dep_ids = []
     
     def add_clause(self, clause: List[int]) -> None:
         assert isinstance(clause, list)
+        if self.prune:
+            # a fixed literal is the constant false F or -F (true), see reachability()
+            false = self.v.false
+            if -false in clause:
+                return
+            if false in clause:
+                clause = [lit for lit in clause if lit != false] or [false]
         self.cnf.append(clause)
         
     def build_cnf(self) -> None:
-        self.defines_DEP()
-        self.defines_ARR()
-        self.defines_ALL()
-        self.duration_constraint()
-        self.add_arrival_constraints()
-        self.add_boarding_constraints()
-        self.add_alternating_constraints()
-        self.add_side_persistence()
-        self.add_location_constraints()
-        self.add_initial_state()
-        self.add_capacity_constraints()
-        self.add_departure_duration_link()
-        self.add_movement_constraints()
+        self.hard_T = self.T
+        self.add_layers(range(0, self.T + 1))
+        self._family(self.add_horizon)
 
         # todo :
         #self.add_capacity_constriants()
 
-    def defines_DEP(self):
+    def add_layers(self, times: range) -> None:
+        """
+        Encodes the time layers in `times`.
+        Layer t holds every clause whose latest time index is t, so layers can
+        be appended one after the other without touching the previous ones.
+        Nothing here depends on the horizon, see horizon_assumptions().
+        """
+        if self.events:
+            self.event_times(times[-1])
+        if 0 in times:
+            self._family(self.add_initial_state)
+        for family in (
+            self.defines_DEP,
+            self.defines_ARR,
+            self.defines_ALL,
+            self.duration_constraint,
+            self.add_arrival_constraints,
+            self.add_boarding_constraints,
+            self.add_alternating_constraints,
+            self.add_side_persistence,
+            self.add_location_constraints,
+            self.add_capacity_constraints,
+            self.add_departure_duration_link,
+            self.add_movement_constraints,
+        ):
+            self._family(family, times)
+        if self.normal_form is not None:
+            self._family(self.add_normal_form, times)
+        self.built_T = max(self.built_T, times[-1])
+
+    def _family(self, family, *args) -> None:
+        """
+        Runs one constraint family. When instrumented, counts its clauses,
+        literals, native constraints, new IDPool variables, wall time and the
+        Python memory (tracemalloc, the memory of a live solver behind a
+        SolverSink is not seen) : peak_bytes, the most it had allocated at
+        once, temporary buffers included, and retained_bytes, what it still
+        holds afterwards. tracemalloc slows the build down, compare the times
+        between families, not with a plain build.
+        """
+        if self.stats is None:
+            family(*args)
+            return
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        sink = self.cnf
+        self.cnf = counter = CountingSink(sink)
+        top = self.v.top
+        mem = tracemalloc.get_traced_memory()[0]
+        # the peak from here on is this family's
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            family(*args)
+        finally:
+            wall = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            retained, peak = current - mem, peak - mem
+            self.cnf = sink
+            if started:
+                tracemalloc.stop()
+
+        row = self.stats.setdefault(family.__name__, dict.fromkeys(
+            ('clauses', 'literals', 'atmosts', 'vars', 'seconds', 'peak_bytes', 'retained_bytes'), 0))
+        row['clauses'] += counter.nclauses
+        row['literals'] += counter.nliterals
+        row['atmosts'] += counter.natmosts
+        row['vars'] += self.v.top - top
+        row['seconds'] += wall
+        # the worst of the add_layers() calls, the retained memory adds up
+        row['peak_bytes'] = max(row['peak_bytes'], peak)
+        row['retained_bytes'] += retained
+        log.debug('%s%s: %d clauses, %d literals, %d vars, %.3fs, peak %d bytes, %d retained',
+                  family.__name__, f' {args[0].start}..{args[0].stop - 1}' if args else '',
+                  counter.nclauses, counter.nliterals, self.v.top - top, wall, peak, retained)
+
+    def report(self) -> List[dict]:
+        """
+        Instrumentation report, one row per constraint family, biggest first :
+        {'family', 'clauses', 'literals', 'atmosts', 'vars', 'seconds', 'peak_bytes',
+         'retained_bytes'}
+        The counters add up over every add_layers() call (extend_to included),
+        peak_bytes is the highest of them.
+        """
+        if self.stats is None:
+            raise ValueError('The builder was not created with instrument=True')
+        rows = [{'family': name, **row} for name, row in self.stats.items()]
+        return sorted(rows, key=lambda row: row['literals'], reverse=True)
+
+    def decode(self, model: List[int], T: Optional[int] = None) -> Schedule:
+        """
+        Integer model of the solver -> Schedule of the horizon T, reading only
+        the dep variables (model[i - 1] is the literal of variable i, as
+        returned by get_model). The ids come from an index grown with the
+        layers, no readable model of every variable is built.
+        """
+        if T is None:
+            T = self.T
+        for t in range(len(self._dep_ids), T):
+            ids = []
+            for p in range(1, self.P + 1):
+                ids.append((p, self.v.obj2id.get(("dep", t, p, "a"), 0),
+                            self.v.obj2id.get(("dep", t, p, "r"), 0)))
+            self._dep_ids.append(ids)
+
+        def true(var):
+            return 0 < var <= len(model) and model[var - 1] > 0
+
+        trips = []
+        for t in range(T):
+            moving, forward = [], True
+            for p, dep_a, dep_r in self._dep_ids[t]:
+                if true(dep_a):
+                    moving.append(p)
+                elif true(dep_r):
+                    moving.append(p)
+                    forward = False
+            if moving:
+                trips.append(Trip(t, moving, forward, max(self.durations[p] for p in moving)))
+        return Schedule(trips, self.durations, T)
+
+    def phases(self, solution: List[tuple], T: Optional[int] = None) -> List[int]:
+        """
+        A (t, moving) schedule -> the literals it gives to the variables of
+        the layers 0 .. T that exist in the pool, for solver.set_phases().
+        The schedule does not have to fit : a greedy plan, the answer at
+        another horizon or for fewer chickens (numbered like the builder's,
+        the missing ones stay on A) is a fine guess, the trips leaving after
+        T are left out.
+        """
+        if T is None:
+            T = self.T
+        unknown = {p for _, moving in solution for p in moving} - set(self.durations)
+        if unknown:
+            raise ValueError(f"Chickens {sorted(unknown)} are not in the instance")
+        schedule = Schedule.from_solution([trip for trip in solution if trip[0] <= T], self.durations, T)
+        lits = []
+
+        def phase(obj, value):
+            # pruned variables are not in the pool
+            var = self.v.obj2id.get(obj)
+            if var is not None:
+                lits.append(var if value else -var)
+
+        speeds = sorted(set(self.durations.values()))
+        landing = {trip.arrival for trip in schedule}
+        for state in schedule.states():
+            t = state.t
+            if not self._is_layer(t):
+                continue
+            phase(("side", t), state.boat_on_A)
+            phase(("ARR", t), t in landing)
+            phase(("DEP", t), state.trip is not None)
+            phase(("ALL", t), not state.at_A)
+            for p in self.durations:
+                phase(("A", p, t), p in state.at_A)
+                phase(("B", p, t), p in state.at_B)
+                for s in self.S:
+                    leaves = state.trip is not None and p in state.trip.moving \
+                        and state.trip.forward == (s == "a")
+                    phase(("dep", t, p, s), leaves)
+            for d in speeds:
+                phase(("dur", t, d), state.trip is not None and state.trip.duration == d)
+        return lits
+
+    def auxiliaries(self) -> List[int]:
+        """
+        Variables nothing reads back from a model, that preprocess.py may
+        eliminate : hArrA / hArrB, DEP, ARR and the cardinality encoding
+        auxiliaries (pool ids without an object). Never dep (decode), ALL
+        (goal, MaxSAT softs) nor what the assumptions use.
+        """
+        named = {var for obj, var in self.v.obj2id.items() if obj[0] in self.AUXILIARIES}
+        return sorted(named | (set(range(1, self.v.top + 1)) - set(self.v.id2obj)))
+
+    def extend_to(self, T: int) -> None:
+        """
+        Moves the horizon to T, only encoding the layers built_T+1 .. T.
+        With a SolverSink the delta goes straight into the live solver, the
+        horizon itself must be given as assumptions (horizon_assumptions).
+        """
+        if T > self.built_T:
+            self.add_layers(range(self.built_T + 1, T + 1))
+        self.T = T
+
+    def horizon_assumptions(self, T: Optional[int] = None) -> List[int]:
+        """
+        Literals that close the formula at the horizon T :
+        - ALL_T (the goal, at the last event time before T)
+        - -dur_t_d for every trip that would land after T (no departure past horizon)
+        """
+        if T is None:
+            T = self.T
+        lits = [self.v.id(("ALL", self.last_layer(T)))]
+        for d in sorted(set(self.durations.values())):
+            for t in range(max(0, T - d + 1), T + 1):
+                if self._is_layer(t):
+                    lits.append(-self.v.id(("dur", t, d)))
+        return lits
+
+    def add_horizon(self) -> None:
+        # the horizon is hard here, extend_to() leaves it to the assumptions
+        for lit in self.horizon_assumptions():
+            self.add_clause([lit])
+
+    def reachability(self) -> dict:
+        """
+        Time windows outside of which a variable has the same value in every
+        model (f is the fastest chicken, d_p the speed of p) :
+        - p is on B at t >= d_p at the earliest (it leaves at 0 at best), so
+          it cannot leave B before d_p either
+        - the boat lands at t >= f at the earliest : no arrival and the boat
+          on A before that, nobody is on B before the slowest chicken
+        With the horizon T of build_cnf(), where everybody is on B :
+        - p leaves A at T - d_p at the latest, leaves B at T - 2 d_p at the
+          latest (it has to cross again), no trip of speed d after T - d and
+          no departure after T - f
+        Returns {'chickens': {p: window}, 'boat': window}.
+        """
+        T = self.hard_T
+        fastest = min(self.durations.values())
+        chickens = {}
+        for p, d in self.durations.items():
+            chickens[p] = {
+                'first_B': d,
+                'last_dep_a': None if T is None else T - d,
+                'first_dep_r': d,
+                'last_dep_r': None if T is None else T - 2 * d,
+            }
+        boat = {
+            'first_B': fastest,
+            'first_ALL': max(self.durations.values()),
+            'last_DEP': None if T is None else T - fastest,
+        }
+        return {'chickens': chickens, 'boat': boat}
+
+    def _fixed(self, obj) -> Optional[bool]:
+        """
+        Value of the variable `obj` in every model according to
+        reachability(), None when it is not known. Fixed variables are
+        never created, see _PrunedPool.
+        """
+        if not isinstance(obj, tuple) or not self.durations:
+            return None
+        kind = obj[0]
+        T = self.hard_T
+        fastest = min(self.durations.values())
+        if kind == "dep":
+            _, t, p, s = obj
+            d = self.durations[p]
+            if s == "r":
+                return False if t < d or (T is not None and t > T - 2 * d) else None
+            return False if T is not None and t > T - d else None
+        if kind == "dur":
+            _, t, d = obj
+            return False if T is not None and t > T - d else None
+        if kind in ("hArrA", "hArrB"):
+            _, start, p, d = obj
+            # the trip is paid at least the speed of p
+            if d < self.durations[p]:
+                return False
+            dep = ("dep", start, p, "r" if kind == "hArrA" else "a")
+            if self._fixed(dep) is False or self._fixed(("dur", start, d)) is False:
+                return False
+            return None
+        if kind == "B":
+            return False if obj[2] < self.durations[obj[1]] else None
+        if kind == "A":
+            return True if obj[2] < self.durations[obj[1]] else None
+        if kind == "ARR":
+            return False if obj[1] < fastest else None
+        if kind == "side":
+            return True if obj[1] < fastest else None
+        if kind == "ALL":
+            return False if obj[1] < max(self.durations.values()) else None
+        if kind == "DEP":
+            return False if T is not None and obj[1] > T - fastest else None
+        return None
+
+    def event_times(self, T: int) -> List[int]:
+        """
+        Times up to T the boat can land at : the sums of trip durations
+        (subset-sum closure of the speeds, with repetitions).
+        Any schedule can be compacted, every trip leaving when the previous
+        one lands, so departures are only needed at those times and the state
+        between two of them never changes : they are the only layers built.
+        """
+        reach = bytearray(T + 1)
+        reach[0] = 1
+        speeds = sorted(set(self.durations.values()))
+        for t in range(T + 1):
+            if reach[t]:
+                for d in speeds:
+                    if t + d <= T:
+                        reach[t + d] = 1
+        points = [t for t in range(T + 1) if reach[t]]
+        self._points = set(points)
+        self._previous = dict(zip(points[1:], points))
+        self._following = dict(zip(points, points[1:]))
+        return points
+
+    def _is_layer(self, t: int) -> bool:
+        return t >= 0 and (not self.events or t in self._points)
+
+    def _next(self, t: int) -> int:
+        return self._following[t] if self.events else t + 1
+
+    def last_layer(self, T: int) -> int:
+        # the goal layer of the horizon T
+        if not self.events:
+            return T
+        return max(t for t in self._points if t <= T)
+
+    def _times(self, times: Optional[range]) -> Iterable[int]:
+        # default : every layer of the current horizon
+        times = range(0, self.T + 1) if times is None else times
+        if not self.events:
+            return times
+        return [t for t in times if t in self._points]
+
+    def _steps(self, times: Optional[range]) -> Iterable[int]:
+        # transitions t -> _next(t) whose arrival layer is in `times`
+        if self.events:
+            return [self._previous[t] for t in self._times(times) if t > 0]
+        times = self._times(times)
+        return range(max(times.start, 1) - 1, times.stop - 1)
+
+    def defines_DEP(self, times=None):
             """
             Defines the master variable DEP_t.
             Logic: DEP_t <-> (Person1_Departs OR Person2_Departs OR ...)
             Meaning: The boat leaves at time t if and only if at least one person is on it.
             """
-            for t in range(0, self.T + 1):
+            for t in self._times(times):
                 DEP_t = self.v.id(("DEP", t))
                 
                 # Collect all individual departures (Aller + Retour) for this time step
@@ -64,44 +449,44 @@ class FormulaBuilderSkeleton:
                     all_person_deps.append(dep_r)
 
                 for dep in all_person_deps:
-                    self.cnf.append([-dep, DEP_t])
+                    self.add_clause([-dep, DEP_t])
 
-                self.cnf.append([-DEP_t] + all_person_deps)
+                self.add_clause([-DEP_t] + all_person_deps)
 
-    def defines_ARR(self):
+    def defines_ARR(self, times=None):
         """
         Define the variable ARR_t. 
         Logic : ARR_t' <=> (dur_t_d OR .... ) where t' = t + d
         Meaning : If there's any voyage of speed d at time t then at t + d theres must be an arrival 
 
         """
-        for t_arr in range(0, self.T + 1):
+        for t_arr in self._times(times):
             arr_var = self.v.id(("ARR", t_arr))
             possible_trips = []
 
             for item in self.durations.items():
                 d=item[1]
                 start_time = t_arr - d
-                if start_time >= 0:
+                if self._is_layer(start_time):
                     dur_var = self.v.id(("dur", start_time, d))
                     possible_trips.append(dur_var)
             
             for trip in possible_trips:
-                self.cnf.append([-trip, arr_var])
+                self.add_clause([-trip, arr_var])
                 
             if possible_trips:
-                self.cnf.append([-arr_var] + possible_trips)
+                self.add_clause([-arr_var] + possible_trips)
             else:
-                self.cnf.append([-arr_var])
+                self.add_clause([-arr_var])
 
-    def defines_ALL(self):
+    def defines_ALL(self, times=None):
         """
         Defines the variable ATT_t.
         Logic : ALL_t <=> ( B_1_t AND B_2_t ... )
         Meaning : If at any point every chicken is at berge B then ALL must be true
 
         """
-        for t in range(0, self.T + 1):
+        for t in self._times(times):
             ALL_t = self.v.id(("ALL", t))
             chickens_in_B = []
             for p in range(1, self.P + 1):
@@ -110,9 +495,7 @@ class FormulaBuilderSkeleton:
             self.add_implication_constraints(chickens_in_B, [ALL_t])
             self.add_implication_constraints([ALL_t], chickens_in_B)
 
-            # goal constraint :
-        
-        self.cnf.append([self.v.id(("ALL", self.T))])
+            # goal constraint : ALL_T, see horizon_assumptions()
 
     def add_initial_state(self) -> None:
         """
@@ -122,13 +505,16 @@ class FormulaBuilderSkeleton:
         - There is no arrivals. 
 
         """
+        if self.prune:
+            # the constant behind every pruned variable
+            self.cnf.append([-self.v.false])
         side0 = self.v.id(("side", 0))
         self.add_clause([side0])
         for p in range(1, self.P + 1):
             self.add_clause([self.v.id(("A", p, 0))])
             self.add_clause([-self.v.id(("B", p, 0))])
 
-            self.cnf.append([-self.v.id(("ARR", 0))])
+        self.add_clause([-self.v.id(("ARR", 0))])
 
     def add_implication_constraints(self, left, right ):
         """
@@ -140,9 +526,9 @@ class FormulaBuilderSkeleton:
         right = list(right)
 
         for r in right:
-            self.cnf.append([-lit for lit in left] + [r])
+            self.add_clause([-lit for lit in left] + [r])
 
-    def duration_constraint(self):
+    def duration_constraint(self, times=None):
         """
         phi_5 : 
         This function adds the duration constraints.
@@ -153,7 +539,7 @@ class FormulaBuilderSkeleton:
 
         """ 
 
-        for t in range(0, self.T+1):
+        for t in self._times(times):
             for item in self.durations.items():
                 d = item[1]
                 dur_t_d = self.v.id(("dur", t, d))
@@ -171,15 +557,15 @@ class FormulaBuilderSkeleton:
 
                 self.add_implication_constraints([dur_t_d], forbidden_trips)
                 if allowed_trips:
-                    self.cnf.append([-dur_t_d]+ allowed_trips)
+                    self.add_clause([-dur_t_d]+ allowed_trips)
                 else : 
-                    self.cnf.append([-dur_t_d])
+                    self.add_clause([-dur_t_d])
     
-    def add_boarding_constraints(self):
+    def add_boarding_constraints(self, times=None):
         """
         """
         # Loop 0 to T-1 (or adjust range if you strictly don't allow start at 0)
-        for t in range(self.T): 
+        for t in self._steps(times): 
             for p in range(1, self.P + 1):
                 dep_t_p_a = self.v.id(("dep", t, p, 'a'))
                 dep_t_p_r = self.v.id(("dep", t, p, 'r'))
@@ -188,49 +574,53 @@ class FormulaBuilderSkeleton:
                 A_p_t_ = self.v.id(("A", p, t))
 
                 # If departing A, must be at A. (Removes the need to check duration)
-                self.cnf.append([-dep_t_p_a, A_p_t_])
+                self.add_clause([-dep_t_p_a, A_p_t_])
                 
                 # If departing B, must be at B.
-                self.cnf.append([-dep_t_p_r, B_p_t_])
+                self.add_clause([-dep_t_p_r, B_p_t_])
 
-    def add_arrival_constraints(self):
+    def add_arrival_constraints(self, times=None):
         """
         """
-        for t in range(0, self.T +1):
+        # indexed by the arrival time t + T_p
+        for t_arr in self._times(times):
             for T_p in self.speed:
+                t = t_arr - T_p
+                if not self._is_layer(t):
+                    continue
                 dur_t_d = self.v.id(("dur", t, T_p))
 
-                if t + T_p > self.T:
-                    continue
                 for p in range(1, self.P+1):
                     dep_t_p_a = self.v.id(("dep", t, p, 'a'))
                     dep_t_p_r = self.v.id(("dep", t, p, 'r'))
 
-                    B_p_t_future = self.v.id(("B", p, t + T_p))
-                    A_p_t_future = self.v.id(("A", p, t + T_p))
+                    B_p_t_future = self.v.id(("B", p, t_arr))
+                    A_p_t_future = self.v.id(("A", p, t_arr))
 
-                    self.cnf.append([-dep_t_p_a, -dur_t_d, B_p_t_future])
-                    self.cnf.append([-dep_t_p_r, -dur_t_d, A_p_t_future])
+                    self.add_clause([-dep_t_p_a, -dur_t_d, B_p_t_future])
+                    self.add_clause([-dep_t_p_r, -dur_t_d, A_p_t_future])
 
 
 
-    def add_alternating_constraints(self):
+    def add_alternating_constraints(self, times=None):
         """
         """
-        for t in range(self.T):
+        for t in self._steps(times):
             side_t = self.v.id(("side", t))
             for p in range(1, self.P+1):
                     dep_t_p_a = self.v.id(("dep", t, p, 'a'))
                     dep_t_p_r = self.v.id(("dep", t, p, 'r'))
 
-                    self.cnf.append([-dep_t_p_a, side_t])
-                    self.cnf.append([-dep_t_p_r, -side_t])
-
+                    self.add_clause([-dep_t_p_a, side_t])
+                    self.add_clause([-dep_t_p_r, -side_t])
 
+        # indexed by the arrival time t + T_p
+        for t_arr in self._times(times):
             for T_p in self.speed:
-                if t + T_p > self.T:
+                t = t_arr - T_p
+                if not self._is_layer(t):
                     continue
-                side_t_future = self.v.id(("side", t + T_p))
+                side_t_future = self.v.id(("side", t_arr))
                 dur_t_d = self.v.id(("dur", t, T_p))
 
                 for p in range(1, self.P+1):
@@ -238,43 +628,42 @@ class FormulaBuilderSkeleton:
                     dep_t_p_r = self.v.id(("dep", t, p, 'r'))
     
                     
-                    self.cnf.append([-dep_t_p_a, -dur_t_d, -side_t_future])
-                    self.cnf.append([-dep_t_p_r, -dur_t_d, side_t_future])
+                    self.add_clause([-dep_t_p_a, -dur_t_d, -side_t_future])
+                    self.add_clause([-dep_t_p_r, -dur_t_d, side_t_future])
 
 
-    def add_side_persistence(self):
-        for t in range(self.T):
+    def add_side_persistence(self, times=None):
+        for t in self._steps(times):
             side_t = self.v.id(("side", t))
-            side_t_next = self.v.id(("side", t + 1))
-            arr_t_next = self.v.id(("ARR", t + 1))
+            side_t_next = self.v.id(("side", self._next(t)))
+            arr_t_next = self.v.id(("ARR", self._next(t)))
 
-            self.cnf.append([arr_t_next, -side_t, side_t_next])
-            self.cnf.append([arr_t_next, side_t, -side_t_next])
+            self.add_clause([arr_t_next, -side_t, side_t_next])
+            self.add_clause([arr_t_next, side_t, -side_t_next])
 
-    def add_location_constraints(self):
+    def add_location_constraints(self, times=None):
         # trie durations 1,3,6 ..etc
         speeds = sorted(set(self.durations.values()))
 
-        for t in range(0, self.T):
+        for t in self._steps(times):
+            t_next = self._next(t)
             for p in range(1, self.P + 1):
 
                 b_curr = self.v.id(("B", p, t))
-                b_next = self.v.id(("B", p, t + 1))
+                b_next = self.v.id(("B", p, t_next))
 
-                a_curr = self.v.id(("A", p, t))
-                a_next = self.v.id(("A", p, t + 1))
+                a_next = self.v.id(("A", p, t_next))
 
                 # a checkin is either in a or b never null part
-                self.cnf.append([a_curr, b_curr])
-                self.cnf.append([-a_curr, -b_curr])
-                self.cnf.append([a_next, b_next])
-                self.cnf.append([-a_next, -b_next])
+                # (at t_next only, t was done by the previous step or the initial state)
+                self.add_clause([a_next, b_next])
+                self.add_clause([-a_next, -b_next])
 
                 arriving_trips = []
 
                 for d in speeds:
-                    start = (t + 1) - d
-                    if start < 0:
+                    start = t_next - d
+                    if not self._is_layer(start):
                         continue
 
                     dur_start_d = self.v.id(("dur", start, d))
@@ -284,25 +673,25 @@ class FormulaBuilderSkeleton:
                     h_arr_B = self.v.id(("hArrB", start, p, d))
 
                     # h_arr_B <-> (dep_a ∧ dur_start_d)
-                    self.cnf.append([-h_arr_B, dep_a])
-                    self.cnf.append([-h_arr_B, dur_start_d])
-                    self.cnf.append([-dep_a, -dur_start_d, h_arr_B])
+                    self.add_clause([-h_arr_B, dep_a])
+                    self.add_clause([-h_arr_B, dur_start_d])
+                    self.add_clause([-dep_a, -dur_start_d, h_arr_B])
 
-                    # effet : si h_arr_B alors p est sur B à t+1
-                    self.cnf.append([-h_arr_B, b_next])
-                    self.cnf.append([-h_arr_B, -a_next])
+                    # effet : si h_arr_B alors p est sur B à t_next
+                    self.add_clause([-h_arr_B, b_next])
+                    self.add_clause([-h_arr_B, -a_next])
 
                     # arrive on A
                     dep_r = self.v.id(("dep", start, p, 'r'))
                     h_arr_A = self.v.id(("hArrA", start, p, d))
 
                     # h_arr_A <-> (dep_r ∧ dur_start_d)
-                    self.cnf.append([-h_arr_A, dep_r])
-                    self.cnf.append([-h_arr_A, dur_start_d])
-                    self.cnf.append([-dep_r, -dur_start_d, h_arr_A])
+                    self.add_clause([-h_arr_A, dep_r])
+                    self.add_clause([-h_arr_A, dur_start_d])
+                    self.add_clause([-dep_r, -dur_start_d, h_arr_A])
 
-                    self.cnf.append([-h_arr_A, a_next])
-                    self.cnf.append([-h_arr_A, -b_next])
+                    self.add_clause([-h_arr_A, a_next])
+                    self.add_clause([-h_arr_A, -b_next])
 
                     arriving_trips.append(h_arr_A)
                     arriving_trips.append(h_arr_B)
@@ -310,50 +699,54 @@ class FormulaBuilderSkeleton:
                 # VITESS if no one arrives don't change
                 # -b_curr OR b_next OR arrivals
                 #  b_curr OR -b_next OR arrivals
-                self.cnf.append([-b_curr, b_next] + arriving_trips)
-                self.cnf.append([b_curr, -b_next] + arriving_trips)
+                self.add_clause([-b_curr, b_next] + arriving_trips)
+                self.add_clause([b_curr, -b_next] + arriving_trips)
 
 
-    def add_capacity_constraints(self):
-        for t in range(self.T):
+    def add_capacity_constraints(self, times=None):
+        for t in self._steps(times):
             chicken_trips = []
 
             for p in range(1, self.P+1):
                 for s in self.S:
                     dep_t_p = self.v.id(("dep", t, p, s))
                     chicken_trips.append(dep_t_p)
+            if self.prune:
+                chicken_trips = [lit for lit in chicken_trips if lit != self.v.false]
+            if len(chicken_trips) <= self.capacity:
+                continue
+            if self.card_encoding == EncType.native:
+                add_atmost(self.cnf, chicken_trips, self.capacity)
+                continue
             cnf_atmost = CardEnc.atmost(
                     lits=chicken_trips,
                     bound=self.capacity,
                     vpool=self.v,
-                    encoding=EncType.seqcounter
+                    encoding=self.card_encoding
                 )
-            self.cnf.extend(cnf_atmost.clauses)
+            for clause in cnf_atmost.clauses:
+                self.add_clause(clause)
     
-    def add_movement_constraints(self):
-        for t in range(self.T):
-            DEP_t = self.v.id(("DEP", t))
+    def add_movement_constraints(self, times=None):
+        # indexed by the blocked departure t_prim, t < t_prim < t + d
+        for t_prim in self._times(times):
+            DEP_t_prim = self.v.id(("DEP", t_prim))
             for d in self.durations.values():
-                dur_t_d = self.v.id(("dur",t,d))
-
-                # Manual check to ensure we don't go past T
-                limit = t + d
-                if limit > self.T:
-                    limit = self.T
-
-                # Iterate only the relevant range
-                for t_prim in range(t + 1, limit):
-                    DEP_t_prim = self.v.id(("DEP", t_prim))
-                    self.cnf.append([-DEP_t, -dur_t_d, -DEP_t_prim])
+                for t in range(max(0, t_prim - d + 1), t_prim):
+                    if not self._is_layer(t):
+                        continue
+                    DEP_t = self.v.id(("DEP", t))
+                    dur_t_d = self.v.id(("dur",t,d))
+                    self.add_clause([-DEP_t, -dur_t_d, -DEP_t_prim])
 
 
 
-    def add_departure_duration_link(self):
+    def add_departure_duration_link(self, times=None):
         """
         Forces the solver to pick a duration if anyone departs.
         Logic: (dep_1 OR dep_2 ...) -> (dur_1 OR dur_2 ...)
         """
-        for t in range(0, self.T + 1):
+        for t in self._times(times):
             
             # 1. Collect all departure variables at time t
             all_deps = []
@@ -361,28 +754,47 @@ class FormulaBuilderSkeleton:
                 all_deps.append(self.v.id(("dep", t, p, 'a')))
                 all_deps.append(self.v.id(("dep", t, p, 'r')))
             
-            # 2. Collect all valid duration variables at time t
+            # 2. Collect all duration variables at time t
+            # (the ones landing after T are switched off by horizon_assumptions)
             valid_durs = []
             unique_speeds = set(self.durations.values())
             for d in unique_speeds:
-                if t + d <= self.T:
-                    valid_durs.append(self.v.id(("dur", t, d)))
+                valid_durs.append(self.v.id(("dur", t, d)))
             
             # 3. Add the Linkage Constraint
             # If any departure is True, at least one duration MUST be True.
             # CNF: -dep_i OR (dur_val_1 OR dur_val_2 ...)
-            
-            if valid_durs:
-                for dep in all_deps:
-                    self.cnf.append([-dep] + valid_durs)
-            else:
-                # If no durations are valid (e.g. near end of T), NO ONE can depart.
-                for dep in all_deps:
-                    self.cnf.append([-dep])
+            for dep in all_deps:
+                self.add_clause([-dep] + valid_durs)
 
 
 
 
+    def add_normal_form(self, times=None):
+        """
+        Symmetry breaking on the idle time of the boat.
+        Any schedule can be compacted (every trip leaving as soon as the previous
+        one has landed) without finishing later, so only compact ones are kept.
+        no_idle :
+            Logic : (ARR_t AND -ALL_t) => DEP_t   and   DEP_0 OR ALL_0
+            Meaning : the boat leaves as soon as it lands, unless everyone is on B.
+        slack_end : no_idle and
+            Logic : ALL_t => -DEP_t
+            Meaning : nobody moves once the goal is reached, all the slack of the
+                      horizon sits after the last trip.
+        """
+        for t in self._times(times):
+            DEP_t = self.v.id(("DEP", t))
+            ALL_t = self.v.id(("ALL", t))
+            if t == 0:
+                self.add_clause([DEP_t, ALL_t])
+            else:
+                self.add_clause([-self.v.id(("ARR", t)), ALL_t, DEP_t])
+
+            if self.normal_form == "slack_end":
+                self.add_clause([-ALL_t, -DEP_t])
+
+
 def print_model(model):
     departures = {}
 
@@ -393,10 +805,79 @@ def print_model(model):
 
     print(departures)
 
-def check_satisfiability(cnf, v):
-    # Using 'g3' (Glucose 3) as the solver
-    with Solver(name='g3', bootstrap_with=cnf) as s:
-        is_satisfiable = s.solve()
+def solve_streamed(fb, solver_name: str = 'g3', warm_start: Optional[List[tuple]] = None,
+                   budget: Optional[Budget] = None):
+    """
+    Same question as check_satisfiability(fb.cnf, fb.v) but the clauses go from
+    the builder into the solver as they are made, no CNF copy in between, and
+    the answer is decoded straight into a Schedule (fb.decode).
+    warm_start : a (t, moving) schedule to start the search from (fb.phases).
+    budget : limits of the solve (budget.py), BudgetExceeded when they run out.
+    fb must not be built yet.
+    """
+    with Solver(name=solver_for(fb.card_encoding == EncType.native, solver_name)) as s:
+        fb.cnf = SolverSink(s)
+        fb.build_cnf()
+        if warm_start is not None:
+            s.set_phases(fb.phases(warm_start))
+        if s.solve() if budget is None else budget.solve(s):
+            return True, fb.decode(s.get_model())
+        return False, None
+
+
+def solve_preprocessed(fb, solver_name: str = 'g3', warm_start: Optional[List[tuple]] = None,
+                       budget: Optional[Budget] = None):
+    """
+    solve_streamed() with preprocess.py between the builder and the solver :
+    the formula is built in a CNF, simplified, solved, and the model is
+    completed again (eliminated auxiliaries) before decoding.
+    fb must not be built yet, and is only solved at its own horizon.
+    """
+    native = fb.card_encoding == EncType.native
+    fb.cnf = CNFPlus() if native else CNF()
+    fb.build_cnf()
+    pre = Preprocessor(fb.auxiliaries())
+    formula = pre.run(fb.cnf)
+    log.debug("preprocess %s", dict(pre.stats))
+    if pre.unsat:
+        return False, None
+    with Solver(name=solver_for(native, solver_name), bootstrap_with=formula) as s:
+        if warm_start is not None:
+            s.set_phases(fb.phases(warm_start))
+        if s.solve() if budget is None else budget.solve(s):
+            return True, fb.decode(pre.extend(s.get_model(), fb.v.top))
+        return False, None
+
+
+def solve_maxsat(fb, lo: int = 0, solver_name: str = 'g3') -> Tuple[int, Schedule]:
+    """
+    Optimum and witness in one MaxSAT run, fb being built at a horizon T that
+    is known to be feasible (an upper bound), not built yet.
+    Hard : the formula of build_cnf() (ALL_T included)
+    Soft : [ALL_t] for every layer t before the goal layer, weighted by the
+           time until the next layer that is past lo (1 without event times)
+    Nothing has to move once everybody is on B, so ALL_t holds from the
+    optimum on in the best models and the weights add up to optimum - lo.
+    RC2 (core-guided) solves it.
+    """
+    fb.cnf = WCNFPlus() if fb.card_encoding == EncType.native else WCNF()
+    fb.build_cnf()
+    for t in fb._times(range(0, fb.last_layer(fb.T))):
+        weight = fb._next(t) - max(t, lo)
+        if weight > 0:
+            fb.cnf.append([fb.v.id(("ALL", t))], weight=weight)
+    with RC2(fb.cnf, solver=solver_for(fb.card_encoding == EncType.native, solver_name),
+             adapt=True, exhaust=True, minz=True) as rc2:
+        model = rc2.compute()
+        if model is None:
+            raise ValueError(f'No schedule within the horizon T={fb.T}')
+        return lo + rc2.cost, fb.decode(model)
+
+
+def check_satisfiability(cnf, v, solver_name: str = 'g3', budget: Optional[Budget] = None):
+    # Using 'g3' (Glucose 3) as the solver by default, portfolio.py races several
+    with Solver(name=solver_name, bootstrap_with=cnf) as s:
+        is_satisfiable = s.solve() if budget is None else budget.solve(s)
         if is_satisfiable:
             model = s.get_model()
             # Map integers back to variable names for readability
@@ -404,10 +885,50 @@ def check_satisfiability(cnf, v):
             return True, readable_model
         else:
             return False, None
+
+
+class HorizonSolver:
+    """
+    One live solver for a growing horizon.
+    solve(T) only sends the new time layers to the solver and closes the
+    formula at T with assumptions, so the learned clauses survive from one
+    horizon to the next (and T can also go back down).
+    """
+    def __init__(self, speed, durations: Dict[int, int], capacity: int = 2, solver_name: str = 'g3',
+                 normal_form: Optional[str] = None, card_encoding: int = EncType.seqcounter):
+        self.solver = Solver(name=solver_for(card_encoding == EncType.native, solver_name))
+        self.fb = FormulaBuilderSkeleton(speed=speed, durations=durations, capacity=capacity, T=0,
+                                         normal_form=normal_form, sink=SolverSink(self.solver),
+                                         card_encoding=card_encoding)
+
+    def solve(self, T: int, warm_start: Optional[List[tuple]] = None, budget: Optional[Budget] = None):
+        # the new layers go straight into the solver
+        self.fb.extend_to(T)
+        if warm_start is not None:
+            self.solver.set_phases(self.fb.phases(warm_start, T))
+
+        assumptions = self.fb.horizon_assumptions(T)
+        if self.solver.solve(assumptions=assumptions) if budget is None \
+                else budget.solve(self.solver, assumptions):
+            return True, self.fb.decode(self.solver.get_model(), T)
+        return False, None
+
+    def close(self) -> None:
+        self.solver.delete()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 if __name__ == "__main__":
     durations = {1: 1, 2: 3, 3: 6, 4: 8}
     speed = [1,3,6,8]
-    fb = FormulaBuilderSkeleton(speed=speed, durations=durations, capacity=2, T=18, P=3)
+    # the CSV wants every variable of every time step, pruned ones included
+    fb = FormulaBuilderSkeleton(speed=speed, durations=durations, capacity=2, T=18, P=3, prune=False,
+                                events=False)
     fb.build_cnf()
     satisfiable, model = check_satisfiability(fb.cnf, fb.v)
     if satisfiable:
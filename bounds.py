@@ -0,0 +1,100 @@
+"""
+Cheap bounds on the optimal crossing time, no SAT involved.
+
+- lower_bound : counts the trips the boat has to do and what they cost at least
+- greedy_schedule : the fastest chicken escorts the others, gives a feasible
+  schedule (so an upper bound) in the (t, moving) format of utiles/tests.verify
+- durations_of : the {chicken: duration} dict the encodings take
+"""
+import math
+
+
+def durations_of(durations: list[int]) -> dict[int, int]:
+    # chickens are numbered from 1 in the encodings
+    return {p: d for p, d in enumerate(durations, start=1)}
+
+
+def min_forward_trips(n: int, c: int) -> int:
+    """
+    Each round trip moves at most c - 1 chickens for good (c go, at least one
+    comes back with the boat) and the last trip moves c of them.
+    """
+    if n <= c:
+        return 1 if n else 0
+    return math.ceil((n - c) / (c - 1)) + 1
+
+
+def lower_bound(durations: list[int], c: int) -> int:
+    """
+    Logic : sort the forward trips by cost, the k-th most expensive one costs at
+    least the ((k-1)*c)-th slowest chicken because the (k-1) trips before it
+    carry at most (k-1)*c chickens. Every other trip costs at least the
+    fastest chicken.
+    """
+    n = len(durations)
+    if n == 0:
+        return 0
+    if c < 2 and n > 1:
+        raise ValueError(f'Cannot bring the boat back with capacity {c=}')
+
+    slowest_first = sorted(durations, reverse=True)
+    fastest = slowest_first[-1]
+    forward = min_forward_trips(n, c)
+    # forward trips carrying the slowest chickens, c by c
+    heavy = slowest_first[::c]
+    cost = sum(heavy) + (forward - len(heavy)) * fastest
+    # returns : at least one chicken rows back after each forward trip but the last
+    cost += (forward - 1) * fastest
+    return cost
+
+
+def greedy_schedule(durations: list[int], c: int) -> tuple[int, list[tuple]]:
+    """
+    Shuttle plan : the fastest chicken takes the c - 1 slowest ones still on A,
+    comes back alone, and so on until everybody fits in the last trip.
+    Returns (makespan, [(t, moving), ...]) with chickens numbered from 1.
+    """
+    n = len(durations)
+    if n == 0:
+        return 0, []
+    if c < 2 and n > 1:
+        raise ValueError(f'Cannot bring the boat back with capacity {c=}')
+
+    chickens = sorted(range(1, n + 1), key=lambda p: durations[p - 1])
+    escort, others = chickens[0], chickens[:0:-1]
+    d_escort = durations[escort - 1]
+
+    t = 0
+    solution = []
+    while len(others) + 1 > c:
+        group, others = others[:c - 1], others[c - 1:]
+        solution.append((t, [escort] + group))
+        t += max(durations[p - 1] for p in group + [escort])
+        solution.append((t, [escort]))
+        t += d_escort
+    last = [escort] + others
+    solution.append((t, last))
+    t += max(durations[p - 1] for p in last)
+    return t, solution
+
+
+def upper_bound(durations: list[int], c: int) -> int:
+    return greedy_schedule(durations, c)[0]
+
+
+def max_trips(durations: list[int], c: int, T: int) -> int:
+    """
+    Number of trips a schedule needs at most to finish by T (if it can).
+    - every trip costs at least the fastest chicken
+    - an optimal regular schedule (see crossing.py) has at most 2n - 1 forward
+      trips : each escort or pure trip drops a settler on B, or pays for a pure
+      trip that does
+    """
+    n = len(durations)
+    if n == 0:
+        return 0
+    if n <= c:
+        regular = 1
+    else:
+        regular = 2 * (2 * n - 1) - 1
+    return max(0, min(regular, T // min(durations)))
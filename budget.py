@@ -0,0 +1,171 @@
+"""
+Time, conflict and propagation budgets for the SAT calls, shared by every
+solve of one request (all the horizons of a find_duration).
+
+    budget = Budget(seconds=5, conflicts=200_000, progress=print)
+    try:
+        T = find_duration(durations, c, engine='sat', budget=budget)
+    except BudgetExceeded as e:
+        e.lo, e.hi      # the optimum is proven to be in [lo, hi]
+
+Budget.solve(solver) is solver.solve() through solve_limited() : a timer
+interrupts the solver when the seconds are spent, conf_budget / prop_budget
+stop it past the conflicts / propagations left. The answer is three-way,
+SAT (True), UNSAT (False) or UNKNOWN (BudgetExceeded raised).
+CaDiCaL and Lingeling have neither solve_limited() nor interrupt(), solve()
+refuses them with a ValueError (UNLIMITED).
+
+With a progress callback the solver is also interrupted every `every`
+seconds to report {'conflicts', 'propagations', 'decisions', 'elapsed'}
+(totals of the budget) and resumed, the learned clauses are kept.
+
+cancel(), from any thread, interrupts the running solve and makes every
+later one raise BudgetExceeded right away (the async front end uses it).
+The solver runs without the GIL meanwhile, other threads keep going.
+"""
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+STATS = ('conflicts', 'propagations', 'decisions')
+# pysat backends without solve_limited() nor interrupt() ('cd15', 'cd19', 'lgl')
+UNLIMITED = ('Cadical103', 'Cadical153', 'Cadical195', 'Lingeling')
+
+
+class BudgetExceeded(TimeoutError):
+    """
+    UNKNOWN : the budget ran out before an answer. lo and hi are the bounds
+    proven so far on what was asked (the optimum, None when nothing is known),
+    stats the report of the budget.
+    """
+    def __init__(self, message: str, lo: Optional[int] = None, hi: Optional[int] = None,
+                 stats: Optional[dict] = None):
+        super().__init__(message)
+        self.lo = lo
+        self.hi = hi
+        self.stats = stats or {}
+
+
+class Budget:
+    def __init__(self, seconds: Optional[float] = None, conflicts: Optional[int] = None,
+                 propagations: Optional[int] = None,
+                 progress: Optional[Callable[[dict], None]] = None, every: float = 1.0):
+        if every <= 0:
+            raise ValueError(f'{every=} must be positive')
+        self.seconds = seconds
+        self.conflicts = conflicts
+        self.propagations = propagations
+        self.progress = progress
+        self.every = every
+        # the clock runs from the creation of the budget, not from the first solve
+        self.start = time.monotonic()
+        self.spent = Counter()
+        self.cancelled = False
+        # the solver of the solve in progress, for cancel()
+        self._solver = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # a copy for another process (batch.py options) starts without a solver
+        state = dict(self.__dict__)
+        del state['_solver'], state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _solver=None, _lock=threading.Lock())
+
+    def fresh(self) -> 'Budget':
+        """The same limits, nothing spent yet and the clock starting now (one per task of a batch)."""
+        return Budget(self.seconds, self.conflicts, self.propagations, self.progress, self.every)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def left(self) -> Optional[float]:
+        """Seconds left, None without a time limit."""
+        if self.seconds is None:
+            return None
+        return self.seconds - self.elapsed()
+
+    def exhausted(self) -> bool:
+        left = self.left()
+        return self.cancelled or (left is not None and left <= 0) \
+            or (self.conflicts is not None and self.spent['conflicts'] >= self.conflicts) \
+            or (self.propagations is not None and self.spent['propagations'] >= self.propagations)
+
+    def limits(self) -> tuple:
+        """(conflicts, propagations) left, None for no limit."""
+        return (None if self.conflicts is None else self.conflicts - self.spent['conflicts'],
+                None if self.propagations is None else self.propagations - self.spent['propagations'])
+
+    def report(self) -> dict:
+        return {**{name: self.spent[name] for name in STATS}, 'elapsed': self.elapsed()}
+
+    def check(self) -> None:
+        """Raises BudgetExceeded once the budget is spent, for the work between two solves."""
+        if self.cancelled:
+            raise BudgetExceeded(f'Cancelled after {self.elapsed():.2f}s', stats=self.report())
+        if self.exhausted():
+            raise BudgetExceeded(f'Budget exhausted after {self.elapsed():.2f}s', stats=self.report())
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        with self._lock:
+            if self._solver is not None:
+                self._solver.interrupt()
+
+    def solve(self, solver, assumptions=()) -> bool:
+        """
+        solver.solve(assumptions) within what is left of the budget.
+        True / False, or BudgetExceeded when it runs out first.
+        """
+        backend = type(getattr(solver, 'solver', solver)).__name__
+        if backend in UNLIMITED:
+            raise ValueError(f'{backend} cannot be interrupted, it does not take a budget')
+        with self._lock:
+            self._solver = solver
+        try:
+            return self._solve(solver, assumptions)
+        finally:
+            with self._lock:
+                self._solver = None
+
+    def _solve(self, solver, assumptions) -> bool:
+        while True:
+            # after the solver is known to cancel() : no cancellation gets lost
+            self.check()
+            conflicts, propagations = self.limits()
+            if conflicts is not None:
+                solver.conf_budget(conflicts)
+            if propagations is not None:
+                solver.prop_budget(propagations)
+            # until the time is spent, or the next progress report
+            wake = self.left()
+            if self.progress is not None:
+                wake = self.every if wake is None else min(wake, self.every)
+
+            before = solver.accum_stats()
+            timer = None
+            if wake is not None:
+                timer = threading.Timer(wake, solver.interrupt)
+                timer.daemon = True
+                timer.start()
+            try:
+                answer = solver.solve_limited(assumptions=assumptions, expect_interrupt=True)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                # the timer or cancel() may have fired after the answer
+                with self._lock:
+                    solver.clear_interrupt()
+                    if self.cancelled:
+                        answer = None
+            after = solver.accum_stats()
+            for name in STATS:
+                self.spent[name] += after.get(name, 0) - before.get(name, 0)
+
+            if answer is not None:
+                return answer
+            if self.progress is not None:
+                self.progress(self.report())
@@ -0,0 +1,160 @@
+"""
+Persistent result cache for gen_solution / find_duration (sqlite, stdlib).
+
+Instances are stored in canonical form :
+- the durations sorted, divided by their gcd g (T is scaled to T // g : every
+  trip costs a multiple of g, so a schedule fits in T iff it fits in g * (T // g))
+- the capacity capped at the number of chickens (one trip carries everybody)
+Chickens are renumbered in sorted order, the witness schedule is stored in
+those numbers and units and translated back on the way out.
+
+For each canonical instance the row keeps what is known about the horizon :
+- sat_min   : smallest T known to be feasible
+- unsat_max : largest T known to be infeasible
+- optimum   : set once both meet
+- witness   : the shortest schedule seen, compacted, and its makespan witness_T
+and answers by monotonicity : feasible at T => feasible after T, infeasible
+at T => infeasible before T. Nothing is inferred from a sub-instance : an
+extra fast chicken can row the boat back and lower the optimum
+([30, 30, 5] needs 65 with c = 2, [2, 30, 5, 30, 2] only 45).
+
+Counters : hits (the question was already answered for that T), inferred
+(answered by monotonicity), misses.
+"""
+import json
+import sqlite3
+from collections import Counter
+from math import gcd
+from typing import List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key       TEXT PRIMARY KEY,
+    c         INTEGER NOT NULL,
+    n         INTEGER NOT NULL,
+    durations TEXT NOT NULL,
+    optimum   INTEGER,
+    sat_min   INTEGER,
+    unsat_max INTEGER,
+    witness   TEXT,
+    witness_T INTEGER
+)
+"""
+
+
+def canonical(durations: List[int], c: int) -> Tuple[tuple, int, int, List[int]]:
+    """
+    Returns (canonical durations, canonical capacity, g, order) where order[i]
+    is the chicken (numbered from 1) behind canonical chicken i + 1.
+    """
+    order = sorted(range(1, len(durations) + 1), key=lambda p: durations[p - 1])
+    g = gcd(*durations) if durations else 1
+    key = tuple(durations[p - 1] // g for p in order)
+    return key, min(c, len(durations)) if durations else c, g, order
+
+
+def _compact(trips: List[List[int]], durations: List[int]) -> Tuple[int, List[tuple]]:
+    # every trip leaves as soon as the previous one has landed
+    t = 0
+    solution = []
+    for moving in trips:
+        solution.append((t, moving))
+        t += max(durations[p - 1] for p in moving)
+    return t, solution
+
+
+class ResultCache:
+    def __init__(self, path: str = ':memory:'):
+        self.db = sqlite3.connect(path)
+        self.db.execute(SCHEMA)
+        self.db.commit()
+        self.counters = Counter(hits=0, inferred=0, misses=0)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+    def _row(self, key: tuple, c: int):
+        return self.db.execute(
+            'SELECT optimum, sat_min, unsat_max, witness, witness_T FROM results WHERE key = ?',
+            (json.dumps([c, key]),)
+        ).fetchone()
+
+    def _update(self, key: tuple, c: int, sat_min: Optional[int] = None,
+                unsat_max: Optional[int] = None, witness: Optional[list] = None) -> None:
+        optimum, old_sat, old_unsat, old_witness, witness_T = self._row(key, c) or (None,) * 5
+        if sat_min is not None and (old_sat is None or sat_min < old_sat):
+            old_sat = sat_min
+        if witness is not None and (witness_T is None or sat_min < witness_T):
+            old_witness, witness_T = json.dumps(witness), sat_min
+        if unsat_max is not None and (old_unsat is None or unsat_max > old_unsat):
+            old_unsat = unsat_max
+        if old_sat is not None and old_unsat is not None and old_unsat + 1 == old_sat:
+            optimum = old_sat
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (json.dumps([c, key]), c, len(key), json.dumps(key), optimum, old_sat, old_unsat,
+                 old_witness, witness_T)
+            )
+
+    def _witness(self, witness: str, g: int, order: List[int]) -> List[tuple]:
+        return [(t * g, [order[p - 1] for p in moving]) for t, moving in json.loads(witness)]
+
+    def solution(self, durations: List[int], c: int, T: int) -> Tuple[bool, Optional[list]]:
+        """
+        (True, schedule or None) when the cache knows the answer of
+        gen_solution(durations, c, T), (False, None) otherwise.
+        """
+        key, c_key, g, order = canonical(durations, c)
+        T_key = T // g
+        row = self._row(key, c_key)
+        if row is not None:
+            optimum, sat_min, unsat_max, witness, witness_T = row
+            if witness is not None and T_key >= witness_T:
+                self.counters['hits' if T_key == witness_T else 'inferred'] += 1
+                return True, self._witness(witness, g, order)
+            if unsat_max is not None and T_key <= unsat_max:
+                self.counters['hits' if T_key == unsat_max else 'inferred'] += 1
+                return True, None
+        self.counters['misses'] += 1
+        return False, None
+
+    def record_solution(self, durations: List[int], c: int, T: int, solution: Optional[list]) -> None:
+        """Stores the answer of gen_solution(durations, c, T)."""
+        key, c_key, g, order = canonical(durations, c)
+        if solution is None:
+            self._update(key, c_key, unsat_max=T // g)
+            return
+        rank = {p: i for i, p in enumerate(order, start=1)}
+        trips = [sorted(rank[p] for p in moving) for _, moving in solution]
+        makespan, witness = _compact(trips, list(key))
+        self._update(key, c_key, sat_min=makespan, witness=witness)
+
+    def duration(self, durations: List[int], c: int) -> Optional[int]:
+        """The optimum if it is known, for find_duration."""
+        key, c_key, g, _ = canonical(durations, c)
+        row = self._row(key, c_key)
+        if row is not None and row[0] is not None:
+            self.counters['hits'] += 1
+            return row[0] * g
+        self.counters['misses'] += 1
+        return None
+
+    def record_duration(self, durations: List[int], c: int, T: int,
+                        solution: Optional[list] = None) -> None:
+        """Stores the answer of find_duration, with an optimal schedule if there is one."""
+        key, c_key, g, _ = canonical(durations, c)
+        if solution is not None:
+            self.record_solution(durations, c, T, solution)
+        else:
+            self._update(key, c_key, sat_min=T // g)
+        self._update(key, c_key, unsat_max=T // g - 1)
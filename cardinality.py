@@ -0,0 +1,76 @@
+"""
+Cardinality encodings for the boat capacity (at most c chickens per trip).
+
+CARD_ENCODINGS maps the names accepted by utiles/project.py to pysat's EncType.
+'native' adds no clause and no auxiliary variable : the constraint goes to
+Minicard/Gluecard as an AtMostK (sinks.add_atmost), the other backends
+cannot take it.
+
+measure() builds the time-indexed formula once per encoding and reports its
+size and solve time, to pick the default for an instance family :
+    python cardinality.py
+"""
+import time
+from typing import Dict, Iterable, List
+
+from pysat.card import EncType
+from pysat.solvers import Solver
+
+from attempt_3 import FormulaBuilderSkeleton
+from sinks import NullSink, SolverSink, solver_for
+
+CARD_ENCODINGS = {
+    'seqcounter': EncType.seqcounter,
+    'totalizer': EncType.totalizer,
+    'sortnetwrk': EncType.sortnetwrk,
+    'cardnetwrk': EncType.cardnetwrk,
+    'mtotalizer': EncType.mtotalizer,
+    'kmtotalizer': EncType.kmtotalizer,
+    'native': EncType.native,
+}
+
+
+def card_encoding(name: str) -> int:
+    if name not in CARD_ENCODINGS:
+        raise ValueError(f'Unknown cardinality encoding {name!r}, expected one of {tuple(CARD_ENCODINGS)}')
+    return CARD_ENCODINGS[name]
+
+
+def measure(durations: List[int], c: int, T: int, encodings: Iterable[str] = CARD_ENCODINGS,
+            solver_name: str = 'g3') -> List[Dict]:
+    """
+    One row per encoding : variables, clauses, native constraints, build and
+    solve time in seconds and the answer (they must all agree).
+    """
+    chickens = {p: d for p, d in enumerate(durations, start=1)}
+    rows = []
+    for name in encodings:
+        enc = card_encoding(name)
+        # size, without keeping the formula
+        fb = FormulaBuilderSkeleton(speed=durations, durations=chickens, capacity=c, T=T,
+                                    sink=NullSink(), card_encoding=enc)
+        fb.build_cnf()
+        size = {'vars': fb.v.top, 'clauses': fb.cnf.nclauses, 'atmosts': fb.cnf.natmosts}
+
+        name_s = solver_for(enc == EncType.native, solver_name)
+        with Solver(name=name_s) as s:
+            start = time.perf_counter()
+            fb = FormulaBuilderSkeleton(speed=durations, durations=chickens, capacity=c, T=T,
+                                        sink=SolverSink(s), card_encoding=enc)
+            fb.build_cnf()
+            built = time.perf_counter()
+            satisfiable = s.solve()
+            solved = time.perf_counter()
+        rows.append({'encoding': name, 'solver': name_s, **size, 'build_s': built - start,
+                     'solve_s': solved - built, 'sat': satisfiable})
+    return rows
+
+
+if __name__ == '__main__':
+    durations, c, T = [1, 3, 6, 8, 2, 10, 4, 12], 3, 26
+    print(f'{durations=} {c=} {T=}')
+    print(f"{'encoding':<12} {'solver':<6} {'vars':>8} {'clauses':>9} {'atmosts':>8} "
+          f"{'build_s':>8} {'solve_s':>8}  sat")
+    for row in measure(durations, c, T):
+        print(f"{row['encoding']:<12} {row['solver']:<6} {row['vars']:>8} {row['clauses']:>9} "
+              f"{row['atmosts']:>8} {row['build_s']:>8.3f} {row['solve_s']:>8.3f}  {row['sat']}")
@@ -0,0 +1,176 @@
+"""
+Exact native engine for the crossing problem (bridge-and-torch / boat).
+
+A trip costs the slowest chicken on board and the boat needs somebody on
+board to come back, so no time grid is needed :
+- capacity 2 : Rote's rule, O(n log n)
+- capacity c : dynamic programming over the trips of a regular schedule, O(c n^2)
+
+Both return (makespan, [(t, moving), ...]) with chickens numbered from 1,
+the format checked by utiles/tests.verify.
+"""
+
+
+def _check(durations: list[int], c: int) -> None:
+    if c < 2 and len(durations) > 1:
+        raise ValueError(f'Cannot bring the boat back with capacity {c=}')
+
+
+def _timeline(trips: list[list[int]], durations: list[int]) -> tuple[int, list[tuple]]:
+    # every trip leaves as soon as the previous one has landed
+    t = 0
+    solution = []
+    for moving in trips:
+        solution.append((t, moving))
+        t += max(durations[p - 1] for p in moving)
+    return t, solution
+
+
+def schedule_c2(durations: list[int]) -> tuple[int, list[tuple]]:
+    """
+    Rote's rule for capacity 2, a1 <= a2 <= ... <= an :
+    while more than 3 chickens wait on A, the two slowest cross either
+    - with the two fastest : {1,2} 1 {n-1,n} 2   costs a1 + 2 a2 + an
+    - escorted by the fastest : {1,n} 1 {1,n-1} 1   costs 2 a1 + a(n-1) + an
+    whichever is cheaper, then {1,3} 1 {1,2} or {1,2} or {1} ends it.
+    """
+    if not durations:
+        return 0, []
+    order = sorted(range(1, len(durations) + 1), key=lambda p: durations[p - 1])
+    a = [durations[p - 1] for p in order]
+    first, second = order[0], order[1] if len(order) > 1 else None
+
+    trips = []
+    n = len(order)
+    while n > 3:
+        slow, slower = order[n - 2], order[n - 1]
+        if 2 * a[1] <= a[0] + a[n - 2]:
+            trips += [[first, second], [first], [slow, slower], [second]]
+        else:
+            trips += [[first, slower], [first], [first, slow], [first]]
+        n -= 2
+    if n == 3:
+        trips += [[first, order[2]], [first], [first, second]]
+    elif n == 2:
+        trips.append([first, second])
+    else:
+        trips.append([first])
+    return _timeline(trips, durations)
+
+
+def _regular_plan(a: list[int], c: int, Q: int):
+    """
+    Best regular schedule using the Q + 1 fastest chickens as nomads.
+    a is sorted, nomads are a[0..Q] and the other ones, the settlers, cross once.
+
+    The trips of a regular schedule are :
+    - pure trips : c settlers, the boat comes back with a nomad left on B
+    - escorts of class q : nomads 1..q+1 and c-1-q settlers, nomad 1 comes
+      back and the q others are left on B, paying the return of q pure trips
+    - the final trip : every nomad and c-1-Q settlers
+    The settlers are handed out to the trips by decreasing capacity, slowest
+    first, which is the cheapest way to fill them. The DP goes through the
+    classes q = 0..Q in that order, over (pure trips still to pay, settlers placed).
+
+    Returns (cost, pure trip count, escorts as (q, first settler), first settler
+    of the final trip) or None.
+    """
+    INF = float('inf')
+    settlers = a[Q + 1:][::-1]
+    S = len(settlers)
+    returns = [a[0] + sum(a[1:q + 1]) for q in range(Q + 1)]
+
+    def block(pos, cap, q):
+        # cost and new position of a trip of class q starting at settler pos
+        if cap > 0 and pos < S:
+            return settlers[pos], min(pos + cap, S)
+        return a[q], pos
+
+    m_max = -(-S // c)
+    cost = [[INF] * (S + 1) for _ in range(m_max + 1)]
+    # m pure trips take the m*c slowest settlers
+    pure = 0
+    for m in range(m_max + 1):
+        if m:
+            pure += settlers[(m - 1) * c]
+        cost[m][min(m * c, S)] = pure
+
+    how = []
+    for q in range(Q + 1):
+        cap = c - 1 - q
+        parent = {}
+        for p in range(m_max, q - 1, -1):
+            row = cost[p]
+            for pos in range(S + 1):
+                g = row[pos]
+                if g == INF or (q == 0 and pos == S):
+                    continue
+                b, npos = block(pos, cap, q)
+                g += returns[q] + b
+                if g < cost[p - q][npos]:
+                    cost[p - q][npos] = g
+                    parent[(p - q, npos)] = (p, pos)
+        how.append(parent)
+
+    best = None
+    cap = c - 1 - Q
+    for pos in range(S + 1):
+        g = cost[0][pos]
+        b, npos = block(pos, cap, Q)
+        if g < INF and npos == S and (best is None or g + b < best[0]):
+            best = (g + b, pos)
+    if best is None:
+        return None
+    total, last = best
+
+    # walk the parents back, class by class, down to the pure trips
+    escorts = []
+    p, pos = 0, last
+    for q in range(Q, -1, -1):
+        while (p, pos) in how[q]:
+            p, pos = how[q][(p, pos)]
+            escorts.append((q, pos))
+    return total, p, escorts[::-1], last
+
+
+def schedule(durations: list[int], c: int) -> tuple[int, list[tuple]]:
+    """Optimal crossing schedule, the fastest engine for the capacity."""
+    _check(durations, c)
+    n = len(durations)
+    if n == 0:
+        return 0, []
+    if n <= c:
+        return max(durations), [(0, list(range(1, n + 1)))]
+    if c == 2:
+        return schedule_c2(durations)
+
+    order = sorted(range(1, n + 1), key=lambda p: durations[p - 1])
+    a = [durations[p - 1] for p in order]
+    best = None
+    for Q in range(0, min(c - 1, n - 1) + 1):
+        plan = _regular_plan(a, c, Q)
+        if plan is not None and (best is None or plan[0] < best[1][0]):
+            best = (Q, plan)
+    Q, (total, m, escorts, last) = best
+
+    # settlers as chicken ids, slowest first
+    settlers = order[Q + 1:][::-1]
+    nomads = order[:Q + 1]
+    S = len(settlers)
+    pure = [settlers[i * c:(i + 1) * c] for i in range(m)]
+
+    trips = []
+    for q, pos in escorts:
+        trips.append(nomads[:q + 1] + settlers[pos:min(pos + c - 1 - q, S)])
+        trips.append([nomads[0]])
+        for k in range(1, q + 1):
+            trips.append(pure.pop())
+            trips.append([nomads[k]])
+    trips.append(nomads + settlers[last:])
+    makespan, solution = _timeline(trips, durations)
+    assert makespan == total, (makespan, total)
+    return makespan, solution
+
+
+def duration(durations: list[int], c: int) -> int:
+    return schedule(durations, c)[0]
@@ -0,0 +1,14 @@
+"""
+The engines of gen_solution / find_duration (utiles/project.py), without
+importing any of them : the command line checks --engine before pysat is
+loaded.
+"""
+
+# native : exact crossing algorithms (crossing.py)
+# astar  : exact A* over the bitmask states (statespace.py), P up to ~20, an
+#          oracle that shares nothing with the other engines
+# sat    : FormulaBuilderSkeleton, kept as fallback and cross-check
+# step   : StepFormulaBuilder, indexed by trip with a binary clock (large durations)
+ENGINES = ('native', 'astar', 'sat', 'step')
+# the engines that answer without a horizon search
+EXACT = ('native', 'astar')
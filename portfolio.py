@@ -0,0 +1,97 @@
+"""
+Solver portfolio : the same formula on several pysat backends at once,
+one process each, the first answer wins and the other processes are killed.
+race() returns the winner with the answer, to tune the default backend.
+"""
+import multiprocessing
+import queue
+import time
+from collections import Counter
+from typing import Optional, Sequence
+
+from pysat.solvers import Solver
+
+# CaDiCaL, Glucose 4, MapleChrono, Glucose 3
+DEFAULT_SOLVERS = ('cd19', 'g4', 'mcb', 'g3')
+
+
+def _run(name: str, formula, results, conflicts: Optional[int], propagations: Optional[int]) -> None:
+    try:
+        with Solver(name=name, bootstrap_with=formula) as s:
+            if conflicts is None and propagations is None:
+                satisfiable = s.solve()
+            else:
+                if conflicts is not None:
+                    s.conf_budget(conflicts)
+                if propagations is not None:
+                    s.prop_budget(propagations)
+                # None : out of conflicts / propagations
+                satisfiable = s.solve_limited()
+            results.put((name, satisfiable, s.get_model() if satisfiable else None, s.accum_stats()))
+    except Exception as e:
+        results.put((name, None, repr(e), {}))
+
+
+def race(formula, solvers: Sequence[str] = DEFAULT_SOLVERS,
+         timeout: Optional[float] = None, conflicts: Optional[int] = None,
+         propagations: Optional[int] = None, spent: Optional[Counter] = None):
+    """
+    formula is a list of clauses, a CNF or a CNFPlus (AtMostK constraints only
+    work on the Minicard/Gluecard backends, the others drop out of the race).
+    Returns (satisfiable, model, winner), model being the integer model of the
+    winner (None if UNSAT). Raises RuntimeError when every backend failed and
+    TimeoutError when nobody answered in `timeout` seconds (for the whole race)
+    or every backend ran out of its `conflicts` / `propagations` (each backend
+    gets all of them). The solver statistics of the backend that ended the
+    race are added to `spent` (Budget.spent).
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_run, args=(name, formula, results, conflicts, propagations),
+                           daemon=True)
+               for name in solvers]
+    for w in workers:
+        w.start()
+
+    errors, exhausted = [], []
+    try:
+        while len(errors) + len(exhausted) < len(workers):
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                name, satisfiable, model, stats = results.get(timeout=left)
+            except queue.Empty:
+                raise TimeoutError(f'No answer from {list(solvers)} after {timeout}s')
+            if satisfiable is None:
+                if model is None:
+                    exhausted.append(name)
+                    last = stats
+                else:
+                    errors.append(f'{name}: {model}')
+                continue
+            if spent is not None:
+                spent.update(stats)
+            return satisfiable, model, name
+        if exhausted:
+            if spent is not None:
+                spent.update(last)
+            raise TimeoutError(f'{exhausted} ran out of conflicts / propagations'
+                               + ''.join(f', {error}' for error in errors))
+        raise RuntimeError('Every solver failed : ' + ', '.join(errors))
+    finally:
+        # cancel the losers
+        for w in workers:
+            if w.is_alive():
+                w.terminate()
+        for w in workers:
+            w.join()
+
+
+def check_satisfiability(cnf, v, solvers: Sequence[str] = DEFAULT_SOLVERS,
+                         timeout: Optional[float] = None):
+    """attempt_3.check_satisfiability raced over `solvers`, plus the winner."""
+    satisfiable, model, winner = race(cnf, solvers, timeout)
+    if not satisfiable:
+        return False, None, winner
+    readable_model = {v.obj(abs(lit)): (lit > 0) for lit in model}
+    return True, readable_model, winner
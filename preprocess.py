@@ -0,0 +1,186 @@
+"""
+CNF preprocessing between build_cnf() and the solver.
+
+    pre = Preprocessor(eliminable=fb.auxiliaries())
+    formula = pre.run(fb.cnf)
+    ... solve formula ...
+    fb.decode(pre.extend(model, fb.v.top))
+
+run() does, in this order :
+- deduplication of the literals and of the clauses, tautologies dropped
+- unit propagation (the fixed literals stay in the formula as unit clauses)
+- subsumption and self-subsuming resolution (strengthening)
+- bounded variable elimination of the `eliminable` variables only : v goes
+  away when the non tautological resolvents of its clauses are not more
+  numerous than those clauses (plus `grow`)
+and extend() rebuilds the eliminated variables from a model of the result,
+the last eliminated first, so the model satisfies the original formula.
+
+Only the clauses are touched, the AtMostK constraints of a CNFPlus are copied
+as they are : their variables must not be in `eliminable`.
+"""
+from collections import Counter, defaultdict
+from typing import Iterable, List, Optional
+
+from pysat.formula import CNF, CNFPlus
+
+
+class Preprocessor:
+    def __init__(self, eliminable: Iterable[int] = (), grow: int = 0, max_occurrences: int = 16):
+        self.eliminable = set(eliminable)
+        # how many more clauses an elimination may leave
+        self.grow = grow
+        # variables with more clauses on one side are not tried
+        self.max_occurrences = max_occurrences
+        # (variable, its clauses) in elimination order, see extend()
+        self.stack = []
+        self.units = []
+        self.unsat = False
+        self.stats = Counter()
+
+    def run(self, formula):
+        """CNF (or CNFPlus) -> simplified copy of the same type."""
+        self._db = []
+        self._occ = defaultdict(set)
+        self._seen = set()
+        self._queue = []
+        self._value = {}
+        self.stats['clauses_in'] = len(formula.clauses)
+
+        for clause in formula.clauses:
+            self._add(frozenset(clause))
+        self._propagate()
+        self._subsume(range(len(self._db)))
+        self._eliminate()
+        self._propagate()
+
+        out = CNFPlus() if isinstance(formula, CNFPlus) else CNF()
+        if self.unsat:
+            out.append([])
+        else:
+            out.extend([lit] for lit in self.units)
+            out.extend(sorted(clause) for clause in self._db if clause is not None)
+        if isinstance(formula, CNFPlus):
+            for lits, bound in formula.atmosts:
+                out.append([lits, bound], is_atmost=True)
+        self.stats['clauses_out'] = len(out.clauses)
+        self.stats['eliminated'] = len(self.stack)
+        self.stats['units'] = len(self.units)
+        del self._db, self._occ, self._seen, self._queue
+        return out
+
+    def extend(self, model: List[int], nvars: Optional[int] = None) -> List[int]:
+        """
+        Model of the preprocessed formula -> model of the original one, as
+        a get_model() list : result[i - 1] is the literal of variable i.
+        """
+        value = {abs(lit): lit > 0 for lit in model}
+        for lit in self.units:
+            value[abs(lit)] = lit > 0
+        for var, clauses in reversed(self.stack):
+            # false satisfies the -var side, true is needed if a var clause
+            # is not satisfied otherwise (the resolvents cover the other side then)
+            value[var] = False
+            for clause in clauses:
+                if not any(value.get(abs(lit), False) == (lit > 0) for lit in clause):
+                    value[var] = True
+                    break
+        top = max(nvars or 0, max(value, default=0))
+        return [i if value.get(i, False) else -i for i in range(1, top + 1)]
+
+    def _add(self, clause: frozenset) -> None:
+        if clause in self._seen:
+            self.stats['duplicates'] += 1
+            return
+        if any(-lit in clause for lit in clause):
+            self.stats['tautologies'] += 1
+            return
+        if not clause:
+            self.unsat = True
+            return
+        index = len(self._db)
+        self._db.append(clause)
+        self._seen.add(clause)
+        for lit in clause:
+            self._occ[lit].add(index)
+        if len(clause) == 1:
+            self._queue.extend(clause)
+
+    def _remove(self, index: int) -> frozenset:
+        clause = self._db[index]
+        self._db[index] = None
+        self._seen.discard(clause)
+        for lit in clause:
+            self._occ[lit].discard(index)
+        return clause
+
+    def _propagate(self) -> None:
+        while self._queue and not self.unsat:
+            lit = self._queue.pop()
+            known = self._value.get(abs(lit))
+            if known is not None:
+                if known != (lit > 0):
+                    self.unsat = True
+                continue
+            self._value[abs(lit)] = lit > 0
+            self.units.append(lit)
+            # satisfied clauses go, -lit goes out of the others
+            for index in list(self._occ[lit]):
+                self._remove(index)
+            for index in list(self._occ[-lit]):
+                self._add(self._remove(index) - {-lit})
+
+    def _subsume(self, indexes: Iterable[int]) -> None:
+        db, occ = self._db, self._occ
+        for index in sorted(indexes, key=lambda i: len(db[i]) if db[i] is not None else 0):
+            clause = db[index]
+            if clause is None or len(clause) < 2:
+                continue
+            # C subsumes D : D has every literal of C, look in the shortest occurrence list
+            lit = min(clause, key=lambda l: len(occ[l]))
+            for other in list(occ[lit]):
+                if other != index and len(db[other]) > len(clause) and clause <= db[other]:
+                    self._remove(other)
+                    self.stats['subsumed'] += 1
+            # C = l v R and D = -l v R v S : D can lose -l
+            for lit in clause:
+                rest = clause - {lit}
+                for other in list(occ[-lit]):
+                    if db[other] is not None and len(db[other]) >= len(clause) and rest <= db[other]:
+                        self._add(self._remove(other) - {-lit})
+                        self.stats['strengthened'] += 1
+                if db[index] is None:
+                    break
+        self._propagate()
+
+    def _eliminate(self) -> None:
+        db, occ = self._db, self._occ
+        candidates = sorted(
+            (var for var in self.eliminable if var not in self._value),
+            key=lambda var: len(occ[var]) * len(occ[-var])
+        )
+        for var in candidates:
+            if self.unsat:
+                return
+            pos, neg = list(occ[var]), list(occ[-var])
+            if not pos and not neg:
+                continue
+            if len(pos) > self.max_occurrences or len(neg) > self.max_occurrences:
+                continue
+            limit = len(pos) + len(neg) + self.grow
+            resolvents = []
+            for i in pos:
+                left = db[i] - {var}
+                for j in neg:
+                    resolvent = left | (db[j] - {-var})
+                    if any(-lit in resolvent for lit in resolvent):
+                        continue
+                    resolvents.append(resolvent)
+                if len(resolvents) > limit:
+                    break
+            if len(resolvents) > limit:
+                continue
+            self.stack.append((var, [sorted(self._remove(i)) for i in pos + neg]))
+            for resolvent in resolvents:
+                self._add(resolvent)
+            self._propagate()
@@ -0,0 +1,83 @@
+"""
+Typed crossing schedule, what the engines decode into and view.py exports.
+
+A Schedule is a list of trips leaving at t with the chickens on board, the
+same information as the (t, moving) lists of utiles/tests.verify plus what
+follows from it : direction, duration, arrival and where everybody is at
+each time step (states(), computed on demand).
+"""
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+
+class Trip(NamedTuple):
+    t: int
+    moving: List[int]
+    forward: bool       # A -> B
+    duration: int
+
+    @property
+    def arrival(self) -> int:
+        return self.t + self.duration
+
+
+class State(NamedTuple):
+    t: int
+    boat_on_A: bool
+    trip: Optional[Trip]    # the trip leaving at t, if any
+    at_A: List[int]
+    at_B: List[int]
+
+
+class Schedule:
+    def __init__(self, trips: List[Trip], durations: Dict[int, int], T: int):
+        self.trips = trips
+        self.durations = durations
+        self.T = T
+
+    @classmethod
+    def from_solution(cls, solution: List[tuple], durations: Dict[int, int], T: int) -> "Schedule":
+        """(t, moving) list -> Schedule, the boat goes A -> B first and then alternates."""
+        trips = [
+            Trip(t, list(moving), i % 2 == 0, max(durations[p] for p in moving))
+            for i, (t, moving) in enumerate(solution)
+        ]
+        return cls(trips, durations, T)
+
+    def solution(self) -> List[tuple]:
+        """The (t, moving) format of gen_solution."""
+        return [(trip.t, trip.moving) for trip in self.trips]
+
+    @property
+    def makespan(self) -> int:
+        return self.trips[-1].arrival if self.trips else 0
+
+    def __len__(self) -> int:
+        return len(self.trips)
+
+    def __iter__(self) -> Iterator[Trip]:
+        return iter(self.trips)
+
+    def states(self, events_only: bool = False) -> Iterator[State]:
+        """
+        Where the boat and the chickens are at t = 0 .. T. Chickens on a trip
+        stay on their bank until the arrival, like the B_p_t of the encoding.
+        events_only : only t = 0 and the times a trip leaves or lands.
+        The at_A / at_B lists are shared by the states between two landings.
+        """
+        on_B = {p: False for p in sorted(self.durations)}
+        boat_on_A = True
+        leaving = {trip.t: trip for trip in self.trips}
+        landing = {trip.arrival: trip for trip in self.trips}
+        times = range(self.T + 1)
+        if events_only:
+            times = sorted(t for t in {0, *leaving, *landing} if t <= self.T)
+        at_A, at_B = list(on_B), []
+        for t in times:
+            trip = landing.get(t)
+            if trip is not None:
+                for p in trip.moving:
+                    on_B[p] = trip.forward
+                boat_on_A = not trip.forward
+                at_A = [p for p in on_B if not on_B[p]]
+                at_B = [p for p in on_B if on_B[p]]
+            yield State(t, boat_on_A, leaving.get(t), at_A, at_B)
@@ -0,0 +1,131 @@
+"""
+Where the builders put their clauses.
+
+The builders only ever call append(clause) and extend(clauses) on their
+`cnf` attribute, so anything with those two methods can stand in for the
+pysat CNF (native cardinality constraints go through add_atmost below) :
+- CNF()              keeps every clause in a Python list (the default)
+- CNFPlus()          same, plus the native AtMostK constraints
+- SolverSink(solver) hands each clause to a live solver, nothing is kept
+- NullSink()         only counts, to measure a formula without storing it
+                     (the variable count is the builder's IDPool top)
+- CountingSink(sink) counts what goes through to another sink, used by the
+                     instrumentation of FormulaBuilderSkeleton
+- ArraySink()        packs the literals in flat int32 arrays, what the
+                     compiled formulas of artifact.py are written from
+"""
+from array import array
+from typing import Iterable, List
+
+from pysat.formula import CNFPlus, WCNFPlus
+
+# the only pysat backends with add_atmost : Minicard, Gluecard 3 and 4
+ATMOST_SOLVERS = ('mc', 'gc3', 'gc4')
+
+
+class SolverSink:
+    def __init__(self, solver):
+        self.solver = solver
+        self.nclauses = 0
+        self.natmosts = 0
+
+    def append(self, clause: List[int]) -> None:
+        self.solver.add_clause(clause)
+        self.nclauses += 1
+
+    def extend(self, clauses: Iterable[List[int]]) -> None:
+        for clause in clauses:
+            self.append(clause)
+
+    def add_atmost(self, lits: List[int], bound: int) -> None:
+        # only ATMOST_SOLVERS know about these
+        self.solver.add_atmost(lits, bound)
+        self.natmosts += 1
+
+
+class NullSink:
+    def __init__(self):
+        self.nclauses = 0
+        self.nliterals = 0
+        self.natmosts = 0
+
+    def append(self, clause: List[int]) -> None:
+        self.nclauses += 1
+        self.nliterals += len(clause)
+
+    def extend(self, clauses: Iterable[List[int]]) -> None:
+        for clause in clauses:
+            self.append(clause)
+
+    def add_atmost(self, lits: List[int], bound: int) -> None:
+        self.natmosts += 1
+        self.nliterals += len(lits)
+
+
+class CountingSink:
+    def __init__(self, sink):
+        self.sink = sink
+        self.nclauses = 0
+        self.nliterals = 0
+        self.natmosts = 0
+
+    def append(self, clause: List[int]) -> None:
+        self.sink.append(clause)
+        self.nclauses += 1
+        self.nliterals += len(clause)
+
+    def extend(self, clauses: Iterable[List[int]]) -> None:
+        for clause in clauses:
+            self.append(clause)
+
+    def add_atmost(self, lits: List[int], bound: int) -> None:
+        add_atmost(self.sink, lits, bound)
+        self.natmosts += 1
+        self.nliterals += len(lits)
+
+
+class ArraySink:
+    def __init__(self):
+        # clause i is lits[offsets[i]:offsets[i + 1]], same for the AtMostK
+        self.lits = array('i')
+        self.offsets = array('q', [0])
+        self.atmost_lits = array('i')
+        self.atmost_offsets = array('q', [0])
+        self.bounds = array('i')
+
+    @property
+    def nclauses(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def natmosts(self) -> int:
+        return len(self.bounds)
+
+    def append(self, clause: List[int]) -> None:
+        self.lits.extend(clause)
+        self.offsets.append(len(self.lits))
+
+    def extend(self, clauses: Iterable[List[int]]) -> None:
+        for clause in clauses:
+            self.append(clause)
+
+    def add_atmost(self, lits: List[int], bound: int) -> None:
+        self.atmost_lits.extend(lits)
+        self.atmost_offsets.append(len(self.atmost_lits))
+        self.bounds.append(bound)
+
+
+def add_atmost(sink, lits: List[int], bound: int) -> None:
+    """Native AtMostK constraint : sum(lits) <= bound, no auxiliary variable."""
+    if isinstance(sink, (CNFPlus, WCNFPlus)):
+        # WCNFPlus (solve_maxsat) is not a CNFPlus, the same hard constraint though
+        sink.append([lits, bound], is_atmost=True)
+    else:
+        sink.add_atmost(lits, bound)
+
+
+def solver_for(native: bool, solver_name: str) -> str:
+    """solver_name, or Gluecard 4 when it cannot take the native constraints."""
+    if native and solver_name not in ATMOST_SOLVERS:
+        return 'gc4'
+    return solver_name
@@ -0,0 +1,90 @@
+"""
+Speculative horizon search : find_duration's SAT/UNSAT questions asked on
+several horizons at once, one process per probe.
+
+The bracket [lo, hi] holds the optimum, hi being known feasible. Every idle
+worker probes the middle of the widest stretch of the bracket nobody is
+probing yet, so k workers cut it in about k + 1 parts. Each answer moves
+lo or hi (feasibility is monotone in T) and the probes it makes pointless
+are killed : a probe above a feasible T or below an infeasible one.
+
+PROBES counts the answers and the cancelled probes of this process.
+"""
+import multiprocessing
+import os
+from collections import Counter
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Optional
+
+PROBES = Counter()
+
+
+def _probe(is_sat: Callable[[int], bool], T: int, conn) -> None:
+    try:
+        conn.send((True, bool(is_sat(T))))
+    except Exception as e:
+        conn.send((False, repr(e)))
+    conn.close()
+
+
+def _next_probe(lo: int, hi: int, running: Dict[int, tuple]) -> Optional[int]:
+    # the middle of the widest stretch of unknown horizons lo .. hi - 1
+    points = [lo - 1] + sorted(T for T in running if lo <= T < hi) + [hi]
+    x, y = max(zip(points, points[1:]), key=lambda gap: gap[1] - gap[0])
+    if y - x < 2:
+        return None
+    return (x + y) // 2
+
+
+def search(is_sat: Callable[[int], bool], lo: int, hi: int, workers: Optional[int] = None) -> int:
+    """
+    Smallest T in [lo, hi] with is_sat(T), knowing that is_sat(hi) holds.
+    is_sat must be picklable (a module level function or a partial of one).
+    """
+    ctx = multiprocessing.get_context()
+    workers = workers or os.cpu_count() or 1
+    # T -> (process, connection) of the probes in flight
+    running = {}
+
+    def cancel(T: int) -> None:
+        process, conn = running.pop(T)
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        conn.close()
+
+    try:
+        while lo < hi:
+            while len(running) < workers:
+                T = _next_probe(lo, hi, running)
+                if T is None:
+                    break
+                conn, child = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_probe, args=(is_sat, T, child), daemon=True)
+                process.start()
+                child.close()
+                running[T] = (process, conn)
+
+            for conn in wait([conn for _, conn in running.values()]):
+                T = next(T for T, (_, c) in running.items() if c is conn)
+                try:
+                    ok, answer = conn.recv()
+                except EOFError:
+                    ok, answer = False, 'the process died'
+                cancel(T)
+                if not ok:
+                    raise RuntimeError(f'Probe of T={T} failed : {answer}')
+                PROBES['sat' if answer else 'unsat'] += 1
+                if answer:
+                    hi = min(hi, T)
+                else:
+                    lo = max(lo, T + 1)
+
+            # what the new bracket already answers
+            for T in [T for T in running if T < lo or T >= hi]:
+                cancel(T)
+                PROBES['cancelled'] += 1
+        return lo
+    finally:
+        for T in list(running):
+            cancel(T)
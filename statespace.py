@@ -0,0 +1,204 @@
+"""
+Exact engine by shortest path in the state graph (A*), independent of
+the SAT encodings, to cross-check them.
+
+A state is (chickens still on A as a bitmask, side of the boat), a move
+takes 1..c chickens of the boat's side across and costs the slowest of
+them. Chickens are renumbered fastest first, so the slowest chicken of a
+move is its highest bit : the max duration of any subset is
+durations[mask.bit_length() - 1], nothing to tabulate.
+Chickens of the same duration are interchangeable : a mask only says how
+many of each duration are on A (the lowest bits of their block are set),
+the schedule picks actual chickens when the path is read back.
+
+Heuristic (admissible, memoised per mask) : the lower bound of bounds.py
+for the chickens still on A, the chickens on B may help to row back so
+every other trip only costs the fastest chicken of all. A* reopens a
+state when a shorter way to it shows up, the answer is optimal.
+
+The graph has up to 2^(P+1) states : about a second at P = 20 with
+durations in 1..10, seconds to minutes at P = 16..20 with durations in
+1..100 (the heuristic is the weak point, not the graph).
+"""
+import heapq
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from bounds import min_forward_trips, upper_bound
+
+# past that the native engine (crossing.py) is the one to use
+MAX_CHICKENS = 24
+
+
+class _Graph:
+    def __init__(self, a: List[int], c: int, single_returns: bool):
+        self.a = a
+        self.c = c
+        self.single_returns = single_returns
+        self.fastest = a[0]
+        self.everybody = (1 << len(a)) - 1
+        self.h_A: Dict[int, int] = {}
+        # (first bit, size) of each block of equal durations
+        self.blocks = []
+        lo = 0
+        for i in range(1, len(a) + 1):
+            if i == len(a) or a[i] != a[lo]:
+                self.blocks.append((lo, i - lo))
+                lo = i
+        self.repeated = [(lo, size) for lo, size in self.blocks if size > 1]
+
+    def cost(self, move: int) -> int:
+        return self.a[move.bit_length() - 1]
+
+    def canonical(self, mask: int) -> int:
+        for lo, size in self.repeated:
+            block = ((1 << size) - 1) << lo
+            k = bin(mask & block).count('1')
+            mask = mask & ~block | ((1 << k) - 1) << lo
+        return mask
+
+    def on_A(self, mask: int) -> int:
+        """Lower bound for the chickens of mask on A, the boat on A."""
+        h = self.h_A.get(mask)
+        if h is not None:
+            return h
+        bits = [i for i in range(mask.bit_length() - 1, -1, -1) if mask >> i & 1]
+        n, c = len(bits), self.c
+        forward = min_forward_trips(n, c)
+        # the k-th dearest forward trip pays at least the ((k - 1) c)-th slowest
+        heavy = [self.a[i] for i in bits[::c]]
+        h = sum(heavy) + (forward - len(heavy)) * self.fastest + max(0, forward - 1) * self.fastest
+        self.h_A[mask] = h
+        return h
+
+    def heuristic(self, mask: int, boat_on_A: bool) -> int:
+        if not mask:
+            return 0
+        if boat_on_A:
+            return self.on_A(mask)
+        # somebody on B rows back first
+        on_B = self.everybody & ~mask
+        return self.a[(on_B & -on_B).bit_length() - 1] + self.on_A(mask)
+
+    def moves(self, mask: int, boat_on_A: bool):
+        if not self.repeated:
+            yield from self._subsets(mask if boat_on_A else self.everybody & ~mask, boat_on_A)
+            return
+        # per duration, the chickens of the boat's side (taking the first k of
+        # them or any other k leads to the same canonical state)
+        groups = []
+        for lo, size in self.blocks:
+            k = bin(mask >> lo & ((1 << size) - 1)).count('1')
+            bits = range(k) if boat_on_A else range(k, size)
+            if bits:
+                groups.append([1 << (lo + i) for i in bits])
+        if boat_on_A and sum(len(bits) for bits in groups) <= self.c:
+            # the last trip : the slowest has to cross anyway
+            yield mask
+            return
+        if not boat_on_A and self.single_returns:
+            for bits in groups:
+                yield bits[0]
+            return
+        yield from self._groups(groups, 0, self.c, 0)
+
+    def _subsets(self, side: int, boat_on_A: bool):
+        bits = [1 << i for i in range(side.bit_length()) if side >> i & 1]
+        if boat_on_A and len(bits) <= self.c:
+            yield side
+            return
+        if not boat_on_A and self.single_returns:
+            yield from bits
+            return
+        for k in range(1, min(self.c, len(bits)) + 1):
+            for group in combinations(bits, k):
+                yield sum(group)
+
+    def _groups(self, groups: list, i: int, room: int, move: int):
+        if i == len(groups):
+            if move:
+                yield move
+            return
+        taken = 0
+        for k in range(min(room, len(groups[i])) + 1):
+            if k:
+                taken |= groups[i][k - 1]
+            yield from self._groups(groups, i + 1, room - k, move | taken)
+
+
+def schedule(durations: List[int], c: int, T: Optional[int] = None,
+             single_returns: bool = True) -> Tuple[Optional[int], Optional[list]]:
+    """
+    Optimal (makespan, [(t, moving), ...]) with chickens numbered from 1.
+    With T, the search stops past T : (None, None) when nothing fits.
+    single_returns : only one chicken rows back, some optimal schedule always
+    does (the regular schedules of crossing.py are of that kind), False tries
+    every group.
+    """
+    n = len(durations)
+    if n == 0:
+        return 0, []
+    if c < 2 and n > 1:
+        raise ValueError(f'Cannot bring the boat back with capacity {c=}')
+    if n > MAX_CHICKENS:
+        raise ValueError(f'{n} chickens is too many for the state graph (at most {MAX_CHICKENS})')
+
+    order = sorted(range(1, n + 1), key=lambda p: durations[p - 1])
+    graph = _Graph([durations[p - 1] for p in order], c, single_returns)
+    everybody = graph.everybody
+
+    # nothing past the greedy schedule (or T) is worth a look
+    limit = upper_bound(durations, c) if T is None else min(T, upper_bound(durations, c))
+    start = (everybody, True)
+    g = {start: 0}
+    parent = {}
+    frontier = [(graph.heuristic(*start), 0, everybody, True)]
+    while frontier:
+        f, cost, mask, boat_on_A = heapq.heappop(frontier)
+        if f > limit:
+            break
+        state = (mask, boat_on_A)
+        if cost > g[state]:
+            continue
+        if not mask:
+            return cost, _path(parent, state, order, graph)
+        for move in graph.moves(mask, boat_on_A):
+            nxt = (graph.canonical(mask & ~move if boat_on_A else mask | move), not boat_on_A)
+            new_cost = cost + graph.cost(move)
+            if new_cost < g.get(nxt, new_cost + 1):
+                f = new_cost + graph.heuristic(*nxt)
+                if f > limit:
+                    continue
+                g[nxt] = new_cost
+                parent[nxt] = (state, move)
+                heapq.heappush(frontier, (f, new_cost, *nxt))
+    return None, None
+
+
+def _path(parent: dict, state: tuple, order: List[int], graph: _Graph) -> list:
+    moves = []
+    while state in parent:
+        state, move = parent[state]
+        moves.append(move)
+    # a move says how many chickens of each duration cross, any of them will do
+    side = {True: list(range(len(order))), False: []}
+    boat_on_A = True
+    t = 0
+    solution = []
+    for move in reversed(moves):
+        moving = []
+        for i in range(move.bit_length()):
+            if move >> i & 1:
+                same = next(j for j in side[boat_on_A] if graph.a[j] == graph.a[i] and j not in moving)
+                moving.append(same)
+        for j in moving:
+            side[boat_on_A].remove(j)
+            side[not boat_on_A].append(j)
+        solution.append((t, sorted(order[j] for j in moving)))
+        t += graph.cost(move)
+        boat_on_A = not boat_on_A
+    return solution
+
+
+def duration(durations: List[int], c: int) -> int:
+    return schedule(durations, c)[0]
@@ -0,0 +1,242 @@
+from pysat.formula import *
+from pysat.solvers import *
+from pysat.card import *
+
+from typing import Dict, List, Optional
+
+from bounds import max_trips
+from budget import Budget
+from sinks import SolverSink, add_atmost, solver_for
+
+
+class StepFormulaBuilder:
+    """
+    Encoding indexed by the crossing number k instead of the time.
+    Trip k goes A -> B when k is even and B -> A when k is odd, the trips
+    that happen are a prefix of 0 .. K-1 and the time only shows up as a
+    binary clock, so the size depends on P, K and log(T), not on T itself.
+
+    Variables :
+    - ("act", k)     trip k happens
+    - ("x", k, p)    chicken p is on trip k
+    - ("B", k, p)    chicken p is on B before trip k (k = K : at the end)
+    - ("cls", k, j)  trip k is paid speeds[j]
+    - ("w", k, i)    bit i of the cost of trip k
+    - ("clk", k, i)  bit i of the time when trip k has landed
+    """
+    def __init__(self, durations: Dict[int, int], capacity: int = 2, T: int = 18,
+                 K: Optional[int] = None, card_encoding: int = EncType.seqcounter, sink=None):
+        self.durations = durations
+        self.capacity = capacity
+        self.T = T
+        self.P = len(durations)
+        self.speeds = sorted(set(durations.values()))
+        self.K = max_trips(list(durations.values()), capacity, T) if K is None else K
+        # enough bits for T, every partial sum is below it
+        self.width = max(T.bit_length(), 1)
+        # boat capacity encoding, EncType.native keeps it as AtMostK constraints
+        self.card_encoding = card_encoding
+
+        # anything with append/extend, see sinks.py
+        if sink is None:
+            sink = CNFPlus() if card_encoding == EncType.native else CNF()
+        self.cnf = sink
+        self.v = IDPool()
+
+    def add_clause(self, clause: List[int]) -> None:
+        assert isinstance(clause, list)
+        self.cnf.append(clause)
+
+    def build_cnf(self) -> None:
+        self.add_initial_state()
+        self.add_prefix_constraints()
+        self.add_boarding_constraints()
+        self.add_capacity_constraints()
+        self.add_position_constraints()
+        self.add_cost_constraints()
+        self.add_clock()
+        self.add_deadline()
+        self.add_goal_constraint()
+
+    def add_initial_state(self) -> None:
+        for p in range(1, self.P + 1):
+            self.add_clause([-self.v.id(("B", 0, p))])
+
+    def add_prefix_constraints(self) -> None:
+        """
+        Logic : act_k <-> (x_k_1 OR x_k_2 ...)   and   act_k+1 => act_k
+        Meaning : a trip happens iff somebody is on board, and once the boat
+                  has stopped it stays where it is.
+        """
+        for k in range(self.K):
+            act = self.v.id(("act", k))
+            on_board = [self.v.id(("x", k, p)) for p in range(1, self.P + 1)]
+            for x in on_board:
+                self.add_clause([-x, act])
+            self.add_clause([-act] + on_board)
+            if k + 1 < self.K:
+                self.add_clause([-self.v.id(("act", k + 1)), act])
+
+    def add_boarding_constraints(self) -> None:
+        """
+        Logic : x_k_p => -B_k_p (k even)   x_k_p => B_k_p (k odd)
+        Meaning : you can only board on the side the boat leaves from.
+        """
+        for k in range(self.K):
+            for p in range(1, self.P + 1):
+                B = self.v.id(("B", k, p))
+                self.add_clause([-self.v.id(("x", k, p)), B if k % 2 else -B])
+
+    def add_capacity_constraints(self) -> None:
+        for k in range(self.K):
+            on_board = [self.v.id(("x", k, p)) for p in range(1, self.P + 1)]
+            if self.card_encoding == EncType.native:
+                add_atmost(self.cnf, on_board, self.capacity)
+                continue
+            card = CardEnc.atmost(lits=on_board, bound=self.capacity, vpool=self.v,
+                                  encoding=self.card_encoding)
+            self.cnf.extend(card.clauses)
+
+    def add_position_constraints(self) -> None:
+        """
+        Logic : B_k+1_p <-> (B_k_p XOR x_k_p)
+        Meaning : a chicken changes side iff it is on the trip.
+        """
+        for k in range(self.K):
+            for p in range(1, self.P + 1):
+                b, b_next = self.v.id(("B", k, p)), self.v.id(("B", k + 1, p))
+                x = self.v.id(("x", k, p))
+                self.add_clause([-b, -x, -b_next])
+                self.add_clause([b, x, -b_next])
+                self.add_clause([-b, x, b_next])
+                self.add_clause([b, -x, b_next])
+
+    def add_cost_constraints(self) -> None:
+        """
+        Logic : act_k <-> (cls_k_1 OR cls_k_2 ...), at most one cls_k_j,
+                x_k_p => OR of cls_k_j with speeds[j] >= durations[p],
+                w_k_i <-> OR of cls_k_j with bit i of speeds[j] set
+        Meaning : every trip is paid one of the speeds, at least the slowest
+                  chicken on board, and w_k is that price in binary.
+        """
+        for k in range(self.K):
+            act = self.v.id(("act", k))
+            cls = [self.v.id(("cls", k, j)) for j in range(len(self.speeds))]
+            for c in cls:
+                self.add_clause([-c, act])
+            self.add_clause([-act] + cls)
+            for i in range(len(cls)):
+                for j in range(i + 1, len(cls)):
+                    self.add_clause([-cls[i], -cls[j]])
+
+            # a trip slower than the horizon would not fit in the clock
+            for j, s in enumerate(self.speeds):
+                if s > self.T:
+                    self.add_clause([-cls[j]])
+
+            for p, d in self.durations.items():
+                fast_enough = [cls[j] for j, s in enumerate(self.speeds) if s >= d]
+                self.add_clause([-self.v.id(("x", k, p))] + fast_enough)
+
+            for i in range(self.width):
+                w = self.v.id(("w", k, i))
+                with_bit = [cls[j] for j, s in enumerate(self.speeds) if s >> i & 1]
+                for c in with_bit:
+                    self.add_clause([-c, w])
+                self.add_clause([-w] + with_bit)
+
+    def add_full_adder(self, a: int, b: int, c: int, s: int, carry: int) -> None:
+        """
+        Logic : s <-> a XOR b XOR c   and   carry <-> at least two of a, b, c
+        """
+        for x in (a, -a):
+            for y in (b, -b):
+                for z in (c, -c):
+                    odd = (x > 0) + (y > 0) + (z > 0)
+                    self.add_clause([-x, -y, -z, s if odd % 2 else -s])
+        self.add_clause([-a, -b, carry])
+        self.add_clause([-a, -c, carry])
+        self.add_clause([-b, -c, carry])
+        self.add_clause([a, b, -carry])
+        self.add_clause([a, c, -carry])
+        self.add_clause([b, c, -carry])
+
+    def add_clock(self) -> None:
+        """
+        Logic : clk_k = clk_k-1 + w_k with a ripple-carry adder, clk_-1 = 0
+        Meaning : clk_k is the time when trip k has landed (trips leave as soon
+                  as the boat is back, waiting never helps). The last carry has
+                  to stay off : the clock never goes past 2^width - 1.
+        """
+        for k in range(self.K):
+            carry = None
+            for i in range(self.width):
+                w = self.v.id(("w", k, i))
+                out = self.v.id(("clk", k, i))
+                if k == 0:
+                    # nothing to add to
+                    self.add_clause([-w, out])
+                    self.add_clause([w, -out])
+                    continue
+                prev = self.v.id(("clk", k - 1, i))
+                if carry is None:
+                    carry = self.v.id(("carry", k, i))
+                    # half adder
+                    self.add_clause([-prev, -w, -out])
+                    self.add_clause([prev, w, -out])
+                    self.add_clause([-prev, w, out])
+                    self.add_clause([prev, -w, out])
+                    self.add_clause([-prev, -w, carry])
+                    self.add_clause([prev, -carry])
+                    self.add_clause([w, -carry])
+                else:
+                    nxt = self.v.id(("carry", k, i))
+                    self.add_full_adder(prev, w, carry, out, nxt)
+                    carry = nxt
+            if carry is not None:
+                self.add_clause([-carry])
+
+    def add_deadline(self) -> None:
+        """
+        Logic : clk_K-1 <= T, for every bit i where T has a 0 :
+                -clk_i OR (some higher bit differs from T)
+        """
+        if self.K == 0:
+            return
+        clock = [self.v.id(("clk", self.K - 1, i)) for i in range(self.width)]
+        for i in range(self.width):
+            if self.T >> i & 1:
+                continue
+            clause = [-clock[i]]
+            for j in range(i + 1, self.width):
+                clause.append(-clock[j] if self.T >> j & 1 else clock[j])
+            self.add_clause(clause)
+
+    def add_goal_constraint(self) -> None:
+        for p in range(1, self.P + 1):
+            self.add_clause([self.v.id(("B", self.K, p))])
+
+    def decode(self, model: List[int]) -> List[tuple]:
+        """Integer model -> [(t, moving), ...], trips leaving back to back."""
+        true = {lit for lit in model if lit > 0}
+        solution = []
+        t = 0
+        for k in range(self.K):
+            moving = [p for p in range(1, self.P + 1) if self.v.id(("x", k, p)) in true]
+            if not moving:
+                break
+            solution.append((t, moving))
+            t += max(self.durations[p] for p in moving)
+        return solution
+
+
+def solve_steps(durations: Dict[int, int], capacity: int, T: int, solver_name: str = 'g3',
+                card_encoding: int = EncType.seqcounter,
+                budget: Optional[Budget] = None) -> Optional[List[tuple]]:
+    with Solver(name=solver_for(card_encoding == EncType.native, solver_name)) as s:
+        fb = StepFormulaBuilder(durations=durations, capacity=capacity, T=T, sink=SolverSink(s),
+                                card_encoding=card_encoding)
+        fb.build_cnf()
+        if s.solve() if budget is None else budget.solve(s):
+            return fb.decode(s.get_model())
+        return None
@@ -0,0 +1,107 @@
+"""
+Asyncio front end of project.py : gen_solution / find_duration as coroutines.
+
+    async with Scheduler(workers=4, max_pending=64) as scheduler:
+        solution = await scheduler.gen_solution(durations, c, T, engine='sat')
+        T = await scheduler.find_duration(durations, c, budget=Budget(seconds=5))
+
+Encoding and solving run on a pool of `workers` threads, the event loop only
+awaits them : pysat solves without the GIL (budget.py), the encoding is
+Python and takes turns with the loop. At most `max_pending` calls are
+admitted at once, the next ones wait for a slot (`pending` counts the
+admitted ones) : a burst of requests queues up in the loop instead of
+piling formulas up in memory.
+
+Cancelling the awaiting task cancels the Budget of the call (one Budget per
+call, a fresh one when none is given) : the running solve is interrupted,
+a call still in line never starts, and the slot is only given back once the
+thread is done with it. The exact engines and the encoding itself are not
+interruptible, a cancelled call stops at its next solve. Neither are
+search='maxsat' / 'parallel', which take no budget : they are not given one,
+a cancelled call of theirs runs to the end in its thread.
+
+With cache=ResultCache(...) the cache is asked and filled in the loop
+thread (a sqlite connection stays in its thread), only the misses are run.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+# project puts the root of the repository on sys.path
+from project import find_duration, gen_solution, ResultCache
+from budget import Budget
+from engines import EXACT
+
+# find_duration searches without a budget (project.find_duration)
+UNBUDGETED = ('maxsat', 'parallel')
+
+
+class Scheduler:
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scheduler')
+        # calls in the executor, running or in line
+        self.slots = asyncio.Semaphore(max_pending or 4 * workers)
+        self.pending = 0
+
+    async def gen_solution(self, durations: list[int], c: int, T: int, *, budget: Budget = None,
+                           cache: ResultCache = None, **options) -> None | list[tuple]:
+        """project.gen_solution, same options."""
+        if cache is not None:
+            known, solution = cache.solution(durations, c, T)
+            if known:
+                return solution
+        solution = await self._run(gen_solution, (durations, c, T), budget, options)
+        if cache is not None:
+            cache.record_solution(durations, c, T, solution)
+        return solution
+
+    async def find_duration(self, durations: list[int], c: int, *, budget: Budget = None,
+                            cache: ResultCache = None, **options) -> int:
+        """project.find_duration, same options."""
+        if cache is not None:
+            T = cache.duration(durations, c)
+            if T is not None:
+                return T
+        T = await self._run(find_duration, (durations, c), budget, options)
+        if cache is not None:
+            cache.record_duration(durations, c, T)
+        return T
+
+    async def _run(self, fn, args: tuple, budget: Optional[Budget], options: dict):
+        if budget is None and options.get('engine', 'native') not in EXACT \
+                and options.get('search') not in UNBUDGETED:
+            # only there for cancel()
+            budget = Budget()
+        if budget is not None:
+            options = {**options, 'budget': budget}
+        async with self.slots:
+            self.pending += 1
+            try:
+                job = self.executor.submit(partial(fn, *args, **options))
+                future = asyncio.wrap_future(job)
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # in line : never starts, running : stops at the solver
+                    if not job.cancel() and budget is not None:
+                        budget.cancel()
+                    await asyncio.wait([future])
+                    if not future.cancelled():
+                        # BudgetExceeded, nobody is waiting for it
+                        future.exception()
+                    raise
+            finally:
+                self.pending -= 1
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # the running calls are awaited off the loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,235 @@
+"""
+Batch front end of project.py : many instances over a pool of worker processes.
+
+    for index, status, solution in gen_solutions(instances, workers=8, timeout=60):
+        ...
+
+Instances are (durations, c, T) tuples (find_durations only reads durations
+and c), the answers come back as (index in the input, status, value) as soon
+as they are ready, or in input order with ordered=True. status is one of
+- 'ok'       value is what gen_solution / find_duration returned
+- 'timeout'  the task ran for more than `timeout` seconds, its worker was killed
+- 'unknown'  the SAT engines ran out of the `budget` option, value is the
+             (lo, hi) bracket of BudgetExceeded
+- 'memory'   MemoryError under the `memory_mb` cap of the worker
+- 'error'    the call raised, value is repr(exception)
+- 'crashed'  the worker died (segfault, killed by the OS, ...), under a
+             memory cap a solver aborting on allocation counts as 'memory'
+A worker that is killed or dies is replaced and the rest of its chunk goes
+to the other workers, so one bad instance never stalls the batch.
+
+The parent hands `chunksize` instances at a time to each idle worker over its
+own pipe, so it always knows what every worker holds, and killing a worker
+cannot leave a shared queue locked. With cache=ResultCache(...)
+the cache is asked and filled in the parent, only the misses are sent out.
+A budget=Budget(...) option is a template : every task gets a fresh copy of
+it (Budget.fresh), the limits are per instance, not shared by the batch.
+The workers are daemon processes and cannot start processes of their own,
+the portfolio (solvers=...) and search='parallel' are refused up front.
+"""
+import multiprocessing
+import os
+import resource
+import signal
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Iterable, Iterator, Optional
+
+from project import find_duration, gen_solution, ResultCache
+from budget import BudgetExceeded
+
+# how long the parent sleeps at most between two checks of the workers
+POLL = 0.5
+
+
+def _call(fn: str, args: tuple, options: dict):
+    if options.get('budget') is not None:
+        options = {**options, 'budget': options['budget'].fresh()}
+    if fn == 'gen_solution':
+        return gen_solution(*args[:3], **options)
+    return find_duration(*args[:2], **options)
+
+
+def _worker(conn, fn: str, options: dict, memory_mb: Optional[int]) -> None:
+    if memory_mb is not None:
+        limit = memory_mb * 2 ** 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    while True:
+        chunk = conn.recv()
+        if chunk is None:
+            return
+        for index, args in chunk:
+            conn.send(('start', index, None))
+            try:
+                answer = ('ok', _call(fn, args, options))
+            except MemoryError:
+                answer = ('memory', None)
+            except BudgetExceeded as e:
+                answer = ('unknown', (e.lo, e.hi))
+            except Exception as e:
+                answer = ('error', repr(e))
+            conn.send(('done', index, answer))
+
+
+class _Worker:
+    def __init__(self, ctx, fn: str, options: dict, memory_mb: Optional[int]):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker, args=(child, fn, options, memory_mb), daemon=True)
+        self.proc.start()
+        child.close()
+        # instances sent and not answered yet, (index, start time) of the running one
+        self.chunk = []
+        self.running = None
+        self.dead = False
+
+    def stop(self, kill: bool = False) -> None:
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.proc.join(timeout=1)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.proc.join()
+        self.conn.close()
+
+
+def run_batch(fn: str, instances: Iterable[tuple], *, workers: Optional[int] = None,
+              chunksize: int = 1, timeout: Optional[float] = None,
+              memory_mb: Optional[int] = None, ordered: bool = False,
+              cache: ResultCache = None, **options) -> Iterator[tuple]:
+    """
+    fn is 'gen_solution' or 'find_duration', options are passed to it
+    (engine=..., search=..., they must be picklable, budget, solvers and search
+    as above). Yields (index, status, value).
+    """
+    if fn not in ('gen_solution', 'find_duration'):
+        raise ValueError(f'Unknown batch function {fn!r}')
+    if chunksize < 1:
+        raise ValueError(f'{chunksize=} must be at least 1')
+    # before any worker starts, a daemon process cannot have children
+    if options.get('solvers'):
+        raise ValueError('solvers=... races processes, it cannot run in a batch worker')
+    if options.get('search') == 'parallel':
+        raise ValueError("search='parallel' uses processes, it cannot run in a batch worker")
+    ctx = multiprocessing.get_context()
+    todo = iter(enumerate(instances))
+    # instances taken back from replaced workers, sent again first
+    retry = deque()
+    # answers not handed out yet
+    ready = deque()
+    # arguments of the instances in flight, to fill the cache
+    args_of = {}
+
+    def lookup(args: tuple):
+        if fn == 'gen_solution':
+            return cache.solution(*args[:3])
+        T = cache.duration(*args[:2])
+        return T is not None, T
+
+    def next_chunk() -> list:
+        chunk = []
+        while retry and len(chunk) < chunksize:
+            chunk.append(retry.popleft())
+        for index, args in todo:
+            if cache is not None:
+                known, value = lookup(args)
+                if known:
+                    ready.append((index, 'ok', value))
+                    continue
+                args_of[index] = args
+            chunk.append((index, args))
+            if len(chunk) == chunksize:
+                break
+        return chunk
+
+    def answer(index: int, status: str, value) -> None:
+        args = args_of.pop(index, None)
+        if args is not None and status == 'ok':
+            if fn == 'gen_solution':
+                cache.record_solution(*args[:3], value)
+            else:
+                cache.record_duration(*args[:2], value)
+        ready.append((index, status, value))
+
+    def replace(worker: _Worker, status: str) -> _Worker:
+        # the running task (the first one if it did not start yet) gets
+        # `status`, the rest of the chunk goes back in line
+        worker.stop(kill=True)
+        if status == 'crashed' and memory_mb is not None and worker.proc.exitcode == -signal.SIGABRT:
+            status = 'memory'
+        failed = worker.running[0] if worker.running else worker.chunk[0][0]
+        answer(failed, status, None)
+        retry.extendleft(reversed([item for item in worker.chunk if item[0] != failed]))
+        return _Worker(ctx, fn, options, memory_mb)
+
+    pool = [_Worker(ctx, fn, options, memory_mb) for _ in range(workers or os.cpu_count() or 1)]
+    buffered = {}
+    next_index = 0
+    try:
+        while True:
+            # idle workers get a new chunk
+            for worker in pool:
+                if not worker.chunk:
+                    worker.chunk = next_chunk()
+                    if worker.chunk:
+                        worker.conn.send(worker.chunk)
+
+            while ready:
+                index, status, value = ready.popleft()
+                if not ordered:
+                    yield index, status, value
+                    continue
+                buffered[index] = (status, value)
+                while next_index in buffered:
+                    yield (next_index, *buffered.pop(next_index))
+                    next_index += 1
+
+            busy = [worker for worker in pool if worker.chunk]
+            if not busy:
+                return
+
+            delay = POLL
+            if timeout is not None:
+                now = time.monotonic()
+                for worker in busy:
+                    if worker.running:
+                        delay = min(delay, max(0.0, worker.running[1] + timeout - now))
+            for conn in wait([worker.conn for worker in busy], delay):
+                worker = next(worker for worker in busy if worker.conn is conn)
+                try:
+                    while conn.poll():
+                        kind, index, payload = conn.recv()
+                        if kind == 'start':
+                            worker.running = (index, time.monotonic())
+                            continue
+                        worker.chunk = [item for item in worker.chunk if item[0] != index]
+                        worker.running = None
+                        answer(index, *payload)
+                except (EOFError, OSError):
+                    # it died, everything it said before is read
+                    worker.dead = True
+
+            now = time.monotonic()
+            for i, worker in enumerate(pool):
+                if not worker.chunk:
+                    continue
+                if timeout is not None and worker.running and now - worker.running[1] > timeout:
+                    pool[i] = replace(worker, 'timeout')
+                elif worker.dead:
+                    pool[i] = replace(worker, 'crashed')
+    finally:
+        for worker in pool:
+            worker.stop()
+
+
+def gen_solutions(instances: Iterable[tuple], **kwargs) -> Iterator[tuple]:
+    """gen_solution over (durations, c, T) instances, see run_batch."""
+    return run_batch('gen_solution', instances, **kwargs)
+
+
+def find_durations(instances: Iterable[tuple], **kwargs) -> Iterator[tuple]:
+    """find_duration over (durations, c) instances, see run_batch."""
+    return run_batch('find_duration', instances, **kwargs)
@@ -0,0 +1,307 @@
+"""
+Scaling benchmark : seeded instance families, one JSON report per run and a
+comparison with a stored baseline.
+
+    python bench.py --quick                      # small grid, checks bench_baseline.json
+    python bench.py --quick --timings            # same, timings included
+    python bench.py --out report.json            # full grid (P up to 200)
+    python bench.py --quick --save-baseline      # refresh the committed baseline
+
+Every case runs in a fresh process, so peak_mb (ru_maxrss) is the case's own
+and a case that goes past --timeout is recorded as such instead of hanging
+the suite. Once an engine times out on a horizon of a family, the larger P
+of the same (capacity, spread) are skipped : that is where the scaling cliff is.
+
+gen_solution cases build the formula even when the bounds would answer
+without it (lower bound, greedy schedule), they measure the encoding.
+
+The comparison checks what does not depend on the machine : answers, cases
+that stop finishing and formula sizes. Timings are only compared with
+--timings, scaled by a calibration run stored with each report (a fixed A*
+search), so a slower machine is not a regression.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import queue
+import random
+import resource
+import sys
+import time
+from itertools import product
+
+from utils import red, green, magenta
+
+# project puts the root of the repository on sys.path
+from project import EXACT, find_duration
+import crossing
+import statespace
+from attempt_3 import FormulaBuilderSkeleton
+from bounds import durations_of
+from sinks import SolverSink
+from step_builder import StepFormulaBuilder
+
+from pysat.solvers import Solver
+
+# duration of a chicken, drawn uniformly in the range
+SPREADS = {
+    'narrow': (1, 10),
+    'wide': (1, 100),
+    'huge': (1, 10_000),
+}
+
+FULL = {
+    'P': (5, 10, 20, 50, 100, 200),
+    'c': (2, 3, 4, 5, 6),
+    'spread': tuple(SPREADS),
+    'engines': ('native', 'astar', 'sat', 'step'),
+}
+
+# every case a few seconds at most, far from the default --timeout
+QUICK = {
+    'P': (4, 5, 6),
+    'c': (2, 3),
+    'spread': ('narrow',),
+    'engines': ('native', 'astar', 'sat', 'step'),
+}
+
+BASELINE = 'bench_baseline.json'
+
+
+def instance(P: int, c: int, spread: str, seed: int = 0) -> list[int]:
+    rng = random.Random(f'{seed}-{P}-{c}-{spread}')
+    lo, hi = SPREADS[spread]
+    return [rng.randint(lo, hi) for _ in range(P)]
+
+
+def horizons(optimum: int) -> dict[str, int]:
+    """The optimum, just below it (UNSAT) and a bit of slack above it."""
+    return {'opt': optimum, 'opt-1': optimum - 1, 'opt+slack': optimum + max(1, optimum // 10)}
+
+
+def _peak_mb() -> float:
+    # KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def _gen_solution(durations: list[int], c: int, T: int, engine: str) -> dict:
+    """encode / solve / decode of one horizon, sizes from the sink and the pool."""
+    row = {'vars': None, 'clauses': None}
+    start = time.perf_counter()
+    if engine in EXACT:
+        if engine == 'native':
+            makespan = crossing.schedule(durations, c)[0]
+        else:
+            makespan = statespace.schedule(durations, c, T)[0]
+        encoded = solved = time.perf_counter()
+        sat = makespan is not None and makespan <= T
+        row['decode_s'] = 0.0
+    else:
+        with Solver(name='g3') as s:
+            if engine == 'sat':
+                fb = FormulaBuilderSkeleton(speed=durations, durations=durations_of(durations),
+                                            capacity=c, T=T, sink=SolverSink(s))
+            else:
+                fb = StepFormulaBuilder(durations=durations_of(durations), capacity=c, T=T,
+                                        sink=SolverSink(s))
+            fb.build_cnf()
+            encoded = time.perf_counter()
+            sat = s.solve()
+            solved = time.perf_counter()
+            if sat:
+                fb.decode(s.get_model())
+            row['decode_s'] = time.perf_counter() - solved
+            row['vars'], row['clauses'] = fb.v.top, fb.cnf.nclauses
+    row.update(encode_s=encoded - start, solve_s=solved - encoded, sat=bool(sat))
+    return row
+
+
+def _find_duration(durations: list[int], c: int, engine: str, search: str = 'gallop') -> dict:
+    start = time.perf_counter()
+    T = find_duration(durations, c, engine=engine, search=search)
+    return {'solve_s': time.perf_counter() - start, 'answer': T}
+
+
+def _child(op: str, args: tuple, results) -> None:
+    try:
+        if op == 'gen_solution':
+            row = _gen_solution(*args)
+        else:
+            # 'find_duration' or 'find_duration:<search>'
+            row = _find_duration(*args, *op.split(':')[1:])
+        row['peak_mb'] = _peak_mb()
+        row['status'] = 'ok'
+    except Exception as e:
+        row = {'status': 'error', 'error': repr(e)}
+    results.put(row)
+
+
+def run_case(op: str, args: tuple, timeout: float) -> dict:
+    """Runs one case in its own process, {'status': 'timeout'} past `timeout` seconds."""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    worker = ctx.Process(target=_child, args=(op, args, results), daemon=True)
+    worker.start()
+    try:
+        return results.get(timeout=timeout)
+    except queue.Empty:
+        return {'status': 'timeout'}
+    finally:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join()
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Seconds of a fixed pure Python workload (best of `repeat`), the unit of the timings."""
+    durations = instance(10, 2, 'narrow')
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(10):
+            statespace.duration(durations, 2)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(grid: dict, seed: int = 0, timeout: float = 30.0, verbose: bool = True) -> dict:
+    rows = []
+    dead = set()
+    for c, spread, P in product(grid['c'], grid['spread'], sorted(grid['P'])):
+        durations = instance(P, c, spread, seed)
+        optimum = crossing.duration(durations, c)
+        family = {'P': P, 'c': c, 'spread': spread, 'seed': seed, 'optimum': optimum}
+        cases = [('gen_solution', label, T) for label, T in horizons(optimum).items()]
+        cases.append(('find_duration', None, None))
+        for engine in grid['engines']:
+            extra = [(f'find_duration:{search}', None, None) for search in grid.get('searches', ())
+                     if engine not in EXACT and (engine == 'sat' or search != 'maxsat')]
+            for op, label, T in cases + extra:
+                key = (engine, op, label, c, spread)
+                row = {**family, 'engine': engine, 'op': op, 'horizon': label, 'T': T}
+                if key in dead or (engine == 'astar' and P > statespace.MAX_CHICKENS):
+                    row['status'] = 'skipped'
+                else:
+                    args = (durations, c, T, engine) if op == 'gen_solution' else (durations, c, engine)
+                    row.update(run_case(op, args, timeout))
+                    if row['status'] == 'timeout':
+                        dead.add(key)
+                rows.append(row)
+                if verbose:
+                    print(_line(row))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'seed': seed,
+            'timeout': timeout,
+            'calibration_s': calibrate(),
+            'grid': grid,
+        },
+        'results': rows,
+    }
+
+
+def _key(row: dict) -> tuple:
+    return row['engine'], row['op'], row['P'], row['c'], row['spread'], row['seed'], row['horizon']
+
+
+def _line(row: dict) -> str:
+    what = f"{row['engine']:<6} {row['op']:<20} P={row['P']:<3} c={row['c']} {row['spread']:<6} " \
+           f"{row['horizon'] or '':<9}"
+    if row['status'] != 'ok':
+        return f"{what} {row['status']}"
+    size = f"{row['vars']}v/{row['clauses']}c" if row.get('vars') is not None else ''
+    return f"{what} encode={row.get('encode_s', 0):.3f}s solve={row['solve_s']:.3f}s " \
+           f"peak={row['peak_mb']:.0f}MB {size}"
+
+
+def compare(report: dict, baseline: dict, timings: bool = False, tolerance: float = 1.5,
+            noise_s: float = 0.05) -> list[str]:
+    """
+    Regressions of `report` against `baseline` :
+    - a different answer (always a bug)
+    - a case that finished in the baseline and does not any more
+    - a formula with more variables or clauses
+    - with timings, a time over tolerance * baseline (and more than noise_s
+      slower), the baseline being scaled by the ratio of the calibrations
+    """
+    now = report['meta'].get('calibration_s')
+    then = baseline['meta'].get('calibration_s')
+    # without both calibrations the reports are taken as from the same machine
+    scale = now / then if now and then else 1.0
+    before = {_key(row): row for row in baseline['results']}
+    problems = []
+    for row in report['results']:
+        old = before.get(_key(row))
+        if old is None or old['status'] != 'ok':
+            continue
+        name = ' '.join(str(x) for x in _key(row))
+        if row['status'] != 'ok':
+            problems.append(f'{name}: {row["status"]} (was ok)')
+            continue
+        for answer in ('sat', 'answer'):
+            if answer in old and row.get(answer) != old[answer]:
+                problems.append(f'{name}: {answer} {row.get(answer)} != {old[answer]}')
+        for field in ('encode_s', 'solve_s', 'decode_s'):
+            if not timings or field not in old:
+                continue
+            expected = scale * old[field]
+            if row[field] > tolerance * expected and row[field] - expected > noise_s:
+                problems.append(f'{name}: {field} {row[field]:.3f}s vs {expected:.3f}s (scaled)')
+        for field in ('vars', 'clauses'):
+            if old.get(field) is not None and row[field] > old[field]:
+                problems.append(f'{name}: {field} {row[field]} vs {old[field]}')
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='small grid, the one of the baseline')
+    parser.add_argument('--engines', nargs='+', help='subset of native, astar, sat, step')
+    parser.add_argument('--searches', nargs='+', default=(),
+                        help="find_duration strategies run besides gallop (linear, binary, maxsat, parallel)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds per case')
+    parser.add_argument('--out', help='where to write the JSON report')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the report as the baseline')
+    parser.add_argument('--timings', action='store_true', help='also compare the (calibrated) timings')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown factor')
+    args = parser.parse_args(argv)
+
+    grid = dict(QUICK if args.quick else FULL)
+    if args.engines:
+        grid['engines'] = tuple(args.engines)
+    grid['searches'] = tuple(args.searches)
+    print(magenta(f'\n   ##########   Benchmark ({"quick" if args.quick else "full"})  ##########   \n'))
+    report = run(grid, args.seed, args.timeout)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(red(f'\tNo baseline at {args.baseline}'))
+        return 0
+    problems = compare(report, baseline, args.timings, args.tolerance)
+    print('')
+    for problem in problems:
+        print(red(f'\t{problem}'))
+    if not problems:
+        print(green('\tNo regression against the baseline!'))
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Command line front end : instances in JSON lines, one JSON result per line.
+
+    python cli.py instances.jsonl > results.jsonl
+    cat instances.jsonl | python cli.py --engine sat --workers 8 --time-limit 10
+
+An instance is {"durations": [...], "c": 2} for the optimum (find_duration)
+or {"durations": [...], "c": 2, "T": 30} for a schedule within T
+(gen_solution), with an optional "id" copied to the result. A result is
+    {"line": 1, "id": ..., "status": "ok", "optimum": 17, "schedule": [[0, [1, 2]], ...], "time_s": ...}
+    {"line": 2, "status": "ok", "T": 30, "feasible": true, "schedule": [...], "time_s": ...}
+    {"line": 3, "status": "unknown", "lo": 40, "hi": 52, "time_s": ...}   past --time-limit
+    {"line": 4, "status": "error", "error": "ValueError(...)"}
+line being the line number in the input (blank lines count), the results
+come out in input order unless --unordered.
+
+The exact engines (native, astar) only import the pure Python modules,
+pysat and the encodings are imported on the first instance that needs them :
+a run over small instances starts in a few tens of milliseconds.
+With --workers N the lines go to N processes by chunks of --chunksize,
+at most --window lines are read ahead.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from functools import partial
+from itertools import islice
+
+# the engines live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crossing
+import statespace
+from budget import Budget, BudgetExceeded
+from engines import ENGINES, EXACT
+
+
+def _solve(instance: dict, engine: str, schedule: bool, time_limit) -> dict:
+    durations, c, T = instance['durations'], instance['c'], instance.get('T')
+    if engine in EXACT:
+        if engine == 'native':
+            makespan, solution = crossing.schedule(durations, c)
+        else:
+            makespan, solution = statespace.schedule(durations, c, T)
+        if T is None:
+            return {'optimum': makespan, 'schedule': solution if schedule else None}
+        feasible = makespan is not None and makespan <= T
+        return {'T': T, 'feasible': feasible, 'schedule': solution if feasible and schedule else None}
+
+    # the SAT engines, pysat comes in here
+    from project import find_duration, gen_solution
+    budget = None if time_limit is None else Budget(seconds=time_limit)
+    try:
+        if T is None:
+            # the schedule the search found at the optimum, no second solve
+            witness = []
+            T = find_duration(durations, c, engine=engine, budget=budget, witness=witness)
+            return {'optimum': T, 'schedule': witness[0] if schedule else None}
+        solution = gen_solution(durations, c, T, engine=engine, budget=budget)
+        return {'T': T, 'feasible': solution is not None, 'schedule': solution if schedule else None}
+    except BudgetExceeded as e:
+        return {'status': 'unknown', 'lo': e.lo, 'hi': e.hi}
+
+
+def answer(numbered: tuple, engine: str = 'native', schedule: bool = True, time_limit=None) -> str:
+    """(line number, JSON line) -> JSON line of the result."""
+    number, line = numbered
+    result = {'line': number}
+    start = time.perf_counter()
+    try:
+        instance = json.loads(line)
+        if 'id' in instance:
+            result['id'] = instance['id']
+        result['status'] = 'ok'
+        result.update(_solve(instance, engine, schedule, time_limit))
+        result['time_s'] = round(time.perf_counter() - start, 6)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = repr(e)
+    if result.get('schedule') is None:
+        result.pop('schedule', None)
+    return json.dumps(result, separators=(',', ':'))
+
+
+def run(lines, out, engine: str = 'native', schedule: bool = True, time_limit=None,
+        workers: int = 1, chunksize: int = 64, window: int = 65536, ordered: bool = True) -> int:
+    """Writes a result line to `out` per non blank line of `lines`, returns how many."""
+    numbered = ((number, line) for number, line in enumerate(lines, start=1) if line.strip())
+    solve = partial(answer, engine=engine, schedule=schedule, time_limit=time_limit)
+    count = 0
+    if workers <= 1:
+        for item in numbered:
+            out.write(solve(item))
+            out.write('\n')
+            count += 1
+        return count
+
+    import multiprocessing
+    with multiprocessing.get_context().Pool(workers) as pool:
+        # a window at a time, Pool.imap would read the whole input ahead
+        while True:
+            chunk = list(islice(numbered, window))
+            if not chunk:
+                return count
+            results = pool.imap(solve, chunk, chunksize) if ordered \
+                else pool.imap_unordered(solve, chunk, chunksize)
+            for result in results:
+                out.write(result)
+                out.write('\n')
+                count += 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', nargs='?', help='JSON lines file, stdin by default')
+    parser.add_argument('-o', '--out', help='where to write the results, stdout by default')
+    parser.add_argument('--engine', choices=ENGINES, default='native')
+    parser.add_argument('--workers', type=int, default=1, help='processes, 0 for one per core')
+    parser.add_argument('--chunksize', type=int, default=64, help='lines sent to a worker at once')
+    parser.add_argument('--window', type=int, default=65536, help='lines read ahead with --workers')
+    parser.add_argument('--unordered', action='store_true', help='results as soon as they are ready')
+    parser.add_argument('--no-schedule', action='store_true', help='only the optimum / feasibility')
+    parser.add_argument('--time-limit', type=float, help='seconds per instance (SAT engines)')
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input is None else open(args.input)
+    out = sys.stdout if args.out is None else open(args.out, 'w', buffering=2 ** 20)
+    try:
+        run(source, out, args.engine, not args.no_schedule, args.time_limit,
+            args.workers or os.cpu_count() or 1, args.chunksize, args.window, not args.unordered)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
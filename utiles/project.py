@@ -1,6 +1,326 @@
-def gen_solution(durations: list[int], c: int, T: int) -> None | list[tuple]:
-    pass
+import logging
+import os
+import sys
+from functools import partial
 
+# the encodings live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def find_duration(durations: list[int], c: int) -> int:
-    pass
+import artifact
+import crossing
+import portfolio
+import speculative
+import statespace
+from budget import Budget, BudgetExceeded
+from cache import ResultCache
+from preprocess import Preprocessor
+from cardinality import card_encoding as _card_encoding
+from attempt_3 import (FormulaBuilderSkeleton, HorizonSolver, solve_maxsat, solve_preprocessed,
+                       solve_streamed)
+from bounds import durations_of, greedy_schedule, lower_bound
+from engines import ENGINES, EXACT
+from step_builder import solve_steps
+
+# the backend of gen_solution(warm_start=...), and the one under a budget
+# (CaDiCaL cannot be interrupted, see budget.UNLIMITED)
+WARM_SOLVER = 'cd19'
+WARM_LIMITED_SOLVER = 'mcb'
+
+log = logging.getLogger(__name__)
+
+
+def _check_engine(engine: str) -> None:
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine!r}, expected one of {ENGINES}')
+
+
+def _sat_solution(durations: list[int], c: int, T: int, engine: str = 'sat',
+                  normal_form: str = None, solvers: tuple = None,
+                  card: str = 'seqcounter', preprocess: bool = False,
+                  warm_start: str | list[tuple] = None, budget: Budget = None,
+                  artifacts: str = None, winners: list = None) -> None | list[tuple]:
+    if solvers and warm_start is not None:
+        raise ValueError('a portfolio races fresh solvers, it does not take a warm_start')
+    # below the lower bound there is nothing to ask the solver
+    if T < lower_bound(durations, c):
+        return None
+    makespan, greedy = greedy_schedule(durations, c)
+    if makespan <= T:
+        return greedy
+    if warm_start == 'greedy':
+        warm_start = greedy
+    if budget is not None:
+        # the encoding is not interruptible, at least do not start one for nothing
+        budget.check()
+    if engine == 'step':
+        return solve_steps(durations_of(durations), c, T, card_encoding=_card_encoding(card), budget=budget)
+
+    if artifacts is not None:
+        # compiled once in the directory, mapped by every later call
+        if solvers or preprocess or warm_start is not None:
+            raise ValueError('artifacts only go with a plain solve (no solvers, preprocess, warm_start)')
+        with artifact.compiled(artifacts, durations, durations_of(durations), c, T, normal_form,
+                               _card_encoding(card)) as formula:
+            satisfiable, schedule = artifact.solve_compiled(formula, budget=budget)
+        return schedule.solution() if satisfiable else None
+
+    fb = FormulaBuilderSkeleton(speed=durations, durations=durations_of(durations), capacity=c, T=T,
+                                normal_form=normal_form, card_encoding=_card_encoding(card))
+    if solvers:
+        # the race needs the clauses in hand, one copy per backend
+        fb.build_cnf()
+        formula = fb.cnf
+        if preprocess:
+            pre = Preprocessor(fb.auxiliaries())
+            formula = pre.run(formula)
+        limits = {}
+        if budget is not None:
+            conflicts, propagations = budget.limits()
+            limits = dict(timeout=budget.left(), conflicts=conflicts, propagations=propagations,
+                          spent=budget.spent)
+        try:
+            satisfiable, model, winner = portfolio.race(formula, solvers, **limits)
+        except TimeoutError as e:
+            raise BudgetExceeded(str(e), stats=budget.report()) from e
+        # which backend to make the default
+        log.debug('T=%d: %s won the race of %s', T, winner, list(solvers))
+        if winners is not None:
+            winners.append((T, winner))
+        if satisfiable and preprocess:
+            model = pre.extend(model, fb.v.top)
+        schedule = fb.decode(model) if satisfiable else None
+    else:
+        # Glucose keeps its own saved phases, CaDiCaL follows the given ones
+        solver_name = 'g3'
+        if warm_start is not None:
+            solver_name = WARM_SOLVER if budget is None else WARM_LIMITED_SOLVER
+        solve = solve_preprocessed if preprocess else solve_streamed
+        satisfiable, schedule = solve(fb, solver_name, warm_start, budget)
+    if not satisfiable:
+        return None
+    return schedule.solution()
+
+
+def gen_solution(durations: list[int], c: int, T: int, *, engine: str = 'native',
+                 cross_check: bool = False, normal_form: str = None,
+                 solvers: tuple = None, card_encoding: str = 'seqcounter',
+                 preprocess: bool = False, warm_start: str | list[tuple] = None,
+                 budget: Budget = None, artifacts: str = None,
+                 cache: ResultCache = None, winners: list = None) -> None | list[tuple]:
+    """
+    A schedule within T, None when there is none.
+    solvers : pysat backends raced on the formula (portfolio.py), the winner
+    is appended to `winners` as (T, backend) when a list is given.
+    artifacts : a directory of compiled formulas (artifact.py) for engine='sat',
+    the formula of (durations, c, T) is only encoded by the first call.
+    budget (budget.py) limits the SAT engines : past it BudgetExceeded is
+    raised (UNKNOWN), with the lower bound and the greedy makespan as lo / hi.
+    The exact engines do not look at it.
+    """
+    _check_engine(engine)
+    if cache is not None:
+        known, solution = cache.solution(durations, c, T)
+        if not known:
+            solution = gen_solution(durations, c, T, engine=engine, cross_check=cross_check,
+                                    normal_form=normal_form, solvers=solvers,
+                                    card_encoding=card_encoding, preprocess=preprocess,
+                                    warm_start=warm_start, budget=budget, artifacts=artifacts,
+                                    winners=winners)
+            cache.record_solution(durations, c, T, solution)
+        return solution
+
+    if engine not in EXACT:
+        try:
+            return _sat_solution(durations, c, T, engine, normal_form, solvers, card_encoding, preprocess,
+                                 warm_start, budget, artifacts, winners)
+        except BudgetExceeded as e:
+            e.lo, e.hi = lower_bound(durations, c), greedy_schedule(durations, c)[0]
+            raise
+
+    if engine == 'astar':
+        # stops at T, nothing past it is explored
+        solution = statespace.schedule(durations, c, T)[1]
+    else:
+        makespan, solution = crossing.schedule(durations, c)
+        if makespan > T:
+            solution = None
+    if cross_check and (solution is None) != (_sat_solution(durations, c, T) is None):
+        raise RuntimeError(f'Engines disagree on {durations=} {c=} {T=}')
+    return solution
+
+
+def _feasible(durations: list[int], c: int, T: int, **options) -> bool:
+    return _sat_solution(durations, c, T, **options) is not None
+
+
+def _search(is_sat, lo: int, hi: int, search: str) -> int:
+    """
+    Smallest T in [lo, hi] with is_sat(T), knowing that is_sat(hi) holds.
+    - linear : lo, lo + 1, ...
+    - binary : bisection of [lo, hi]
+    - gallop : lo, lo + 2, lo + 6, lo + 14, ... (each miss moves lo past the
+               probe and doubles the step) then bisection of the last gap
+               (the optimum is usually close to the lower bound)
+    find_duration also takes search='maxsat', one RC2 run (attempt_3.solve_maxsat),
+    and search='parallel', several horizons at once (speculative.py).
+    """
+    if search == 'linear':
+        while lo < hi and not is_sat(lo):
+            lo += 1
+        return lo
+
+    if search == 'gallop':
+        step = 1
+        while lo < hi:
+            probe = min(lo + step - 1, hi)
+            if is_sat(probe):
+                hi = probe
+                break
+            lo = probe + 1
+            step *= 2
+    elif search != 'binary':
+        raise ValueError(f'Unknown search strategy {search!r}')
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if is_sat(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _exact_schedule(durations: list[int], c: int, engine: str,
+                    cross_check: bool = False) -> tuple[int, list[tuple]]:
+    # (optimum, optimal schedule) of an exact engine
+    T, solution = crossing.schedule(durations, c) if engine == 'native' else statespace.schedule(durations, c)
+    if cross_check and (
+        _sat_solution(durations, c, T) is None
+        or (T > 0 and _sat_solution(durations, c, T - 1) is not None)
+    ):
+        raise RuntimeError(f'Engines disagree on {durations=} {c=} ({T=})')
+    return T, solution
+
+
+def find_duration(durations: list[int], c: int, *, engine: str = 'native',
+                  incremental: bool = True, search: str = 'gallop',
+                  cross_check: bool = False, normal_form: str = None,
+                  solvers: tuple = None, card_encoding: str = 'seqcounter',
+                  preprocess: bool = False, workers: int = None,
+                  budget: Budget = None, cache: ResultCache = None, winners: list = None,
+                  witness: list = None) -> int:
+    """
+    The optimal makespan.
+    winners : with solvers, (T, backend) of every horizon raced, see gen_solution.
+    witness : when a list is given, an optimal schedule is appended to it, the
+    one the search found at the optimum (search='parallel' only answers yes
+    or no, it takes one more solve at the optimum).
+    budget (budget.py) is shared by the horizons of the search : past it
+    BudgetExceeded is raised (UNKNOWN) with the bracket [lo, hi] proven so
+    far, hi being feasible. The exact engines do not look at it.
+    """
+    _check_engine(engine)
+    if cache is not None:
+        T = cache.duration(durations, c)
+        if T is None:
+            found = []
+            if engine in EXACT:
+                # the exact engines have the optimal schedule for free, one search for both
+                T, solution = _exact_schedule(durations, c, engine, cross_check)
+                found.append(solution)
+            else:
+                T = find_duration(durations, c, engine=engine, incremental=incremental, search=search,
+                                  cross_check=cross_check, normal_form=normal_form, solvers=solvers,
+                                  card_encoding=card_encoding, preprocess=preprocess, workers=workers,
+                                  budget=budget, winners=winners, witness=found)
+            cache.record_duration(durations, c, T, found[0])
+            if witness is not None:
+                witness.append(found[0])
+        elif witness is not None:
+            known, solution = cache.solution(durations, c, T)
+            if not known or solution is None:
+                solution = gen_solution(durations, c, T, engine=engine, normal_form=normal_form,
+                                        card_encoding=card_encoding, budget=budget)
+            witness.append(solution)
+        return T
+
+    wanted = witness is not None
+    if not wanted:
+        # nobody looks at it
+        witness = []
+    if engine in EXACT:
+        T, solution = _exact_schedule(durations, c, engine, cross_check)
+        witness.append(solution)
+        return T
+
+    if not durations:
+        witness.append([])
+        return 0
+    lo = lower_bound(durations, c)
+    hi, greedy = greedy_schedule(durations, c)
+    if lo == hi:
+        witness.append(greedy)
+        return lo
+    if budget is not None and search in ('maxsat', 'parallel'):
+        raise ValueError(f"search={search!r} does not take a budget")
+
+    # one MaxSAT run at the greedy horizon instead of a search over T
+    if search == 'maxsat':
+        if engine != 'sat':
+            raise ValueError(f"search='maxsat' needs engine='sat', not {engine!r}")
+        fb = FormulaBuilderSkeleton(speed=durations, durations=durations_of(durations), capacity=c, T=hi,
+                                    normal_form=normal_form, card_encoding=_card_encoding(card_encoding))
+        T, schedule = solve_maxsat(fb, lo)
+        witness.append(schedule.solution())
+        return T
+
+    # one fresh formula per probe, `workers` probes at a time
+    if search == 'parallel':
+        if solvers:
+            raise ValueError("search='parallel' already uses the cores, no portfolio inside")
+        feasible = partial(_feasible, durations, c, engine=engine, normal_form=normal_form,
+                           card=card_encoding, preprocess=preprocess)
+        T = speculative.search(feasible, lo, hi, workers)
+        if wanted:
+            witness.append(_sat_solution(durations, c, T, engine, normal_form, card=card_encoding,
+                                         preprocess=preprocess))
+        return T
+
+    # what the answers so far prove, for BudgetExceeded, and the schedule at hi
+    bracket = [lo, hi]
+    best = [greedy]
+
+    def proving(solve):
+        def probe(T: int) -> bool:
+            solution = solve(T)
+            if solution is None:
+                bracket[0] = max(bracket[0], T + 1)
+                return False
+            if T < bracket[1]:
+                bracket[1], best[0] = T, solution
+            return True
+        return probe
+
+    try:
+        # a portfolio races a fresh formula per horizon, and preprocessing
+        # eliminates variables the next layers would need
+        if not incremental or engine == 'step' or solvers or preprocess:
+            T = _search(
+                proving(lambda T: _sat_solution(durations, c, T, engine, normal_form, solvers,
+                                                card_encoding, preprocess, budget=budget,
+                                                winners=winners)),
+                lo, hi, search
+            )
+        else:
+            # one solver for every horizon, the layers T+1, T+2, ... are added as deltas
+            with HorizonSolver(durations, durations_of(durations), capacity=c, normal_form=normal_form,
+                               card_encoding=_card_encoding(card_encoding)) as hs:
+                def horizon(T: int) -> None | list[tuple]:
+                    satisfiable, schedule = hs.solve(T, budget=budget)
+                    return schedule.solution() if satisfiable else None
+                T = _search(proving(horizon), lo, hi, search)
+    except BudgetExceeded as e:
+        e.lo, e.hi = bracket
+        raise
+    witness.append(best[0])
+    return T
@@ -1,12 +1,30 @@
+import asyncio
 import atexit
+import io
+import json
+import os
+import tempfile
+import time
 from functools import wraps
 from inspect import getfullargspec
 
 from utils import blue, red, green, magenta
 
+from aio import Scheduler
+import artifact
+from schedule import Schedule
+from view import export_schedule_to_csv
+import cli
+from batch import gen_solutions, find_durations
+
 from project import (
-    gen_solution, find_duration
+    gen_solution, find_duration, ResultCache
 )
+from budget import Budget, BudgetExceeded
+from attempt_3 import FormulaBuilderSkeleton
+from bounds import durations_of
+from sinks import CountingSink
+from pysat.formula import CNF
 
 pos_success = 0
 pos_fail    = 0
@@ -116,6 +134,18 @@ def test_negative(caller, callback, instances):
             print(f'\t{prefix} Test {red("failed")}')
             neg_fail += 1
 
+
+def check(caller, ok, msg):
+    """A single yes / no check, counted with the positive tests."""
+    global pos_success, pos_fail
+    prefix = (f'[{caller}+:Check]').ljust(20)
+    if ok:
+        print(f'\t{prefix} Test {green("passed")}')
+        pos_success += 1
+    else:
+        print(f'\t{prefix} Test {red("failed")}: {msg}')
+        pos_fail += 1
+
 ########## Define test functions here below
 
 
@@ -143,17 +173,18 @@ SMALL_INSTANCES = [
     ([1, 4, 10, 12, 5], 2, 31)
 ]
 
+SMALL_INSTANCES_NEG = [
+    ([1, 1, 1, 1], 3, 1),
+    ([1, 1, 1, 1], 2, 4),
+    ([2, 3, 4], 2, 8),
+    ([1, 2, 5, 10], 2, 16),
+    ([1, 4, 10, 12, 5], 2, 15),
+    ([1, 4, 10, 12, 5], 2, 30)
+]
+
 
 def test_small_Q2():
     SMALL_INSTANCES_POS = SMALL_INSTANCES
-    SMALL_INSTANCES_NEG = [
-        ([1, 1, 1, 1], 3, 1),
-        ([1, 1, 1, 1], 2, 4),
-        ([2, 3, 4], 2, 8),
-        ([1, 2, 5, 10], 2, 16),
-        ([1, 4, 10, 12, 5], 2, 15),
-        ([1, 4, 10, 12, 5], 2, 30)
-    ]
     test_positive('test_small', gen_solution, SMALL_INSTANCES_POS)
     test_negative('test_small', gen_solution, SMALL_INSTANCES_NEG)
 
@@ -162,6 +193,501 @@ def test_small_Q3():
     test_positive('test_small', find_duration, SMALL_INSTANCES, _verify_size)
 
 
+def _gen_solution_sat(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat')
+
+
+def _find_duration_sat(durations, c):
+    return find_duration(durations, c, engine='sat')
+
+
+def _find_duration_maxsat(durations, c):
+    return find_duration(durations, c, engine='sat', search='maxsat')
+
+
+def _find_duration_parallel(durations, c):
+    return find_duration(durations, c, engine='sat', search='parallel', workers=3)
+
+
+def _find_duration_witness(**options):
+    # the optimal schedule found by the search, checked at the optimum
+    def find(durations, c):
+        witness = []
+        find_duration(durations, c, engine='sat', witness=witness, **options)
+        return witness[0]
+    return find
+
+
+def test_small_witness():
+    # the cache is asked twice : a miss, then a hit
+    cached = {'cache': ResultCache()}
+    for options in ({}, {'incremental': False}, {'search': 'maxsat'}, {'search': 'parallel', 'workers': 3},
+                    cached, cached):
+        test_positive('test_small_witness', _find_duration_witness(**options), SMALL_INSTANCES)
+
+
+def test_small_sat():
+    # the SAT fallback must agree with the native engine
+    test_positive('test_small_sat', _gen_solution_sat, SMALL_INSTANCES)
+    test_negative('test_small_sat', _gen_solution_sat, SMALL_INSTANCES_NEG)
+    test_positive('test_small_sat', _find_duration_sat, SMALL_INSTANCES, _verify_size)
+    test_positive('test_small_sat', _find_duration_maxsat, SMALL_INSTANCES, _verify_size)
+    test_positive('test_small_sat', _find_duration_parallel, SMALL_INSTANCES, _verify_size)
+
+
+def _gen_solution_step(durations, c, T):
+    return gen_solution(durations, c, T, engine='step')
+
+
+def _find_duration_step(durations, c):
+    return find_duration(durations, c, engine='step')
+
+
+def test_small_step():
+    test_positive('test_small_step', _gen_solution_step, SMALL_INSTANCES)
+    test_negative('test_small_step', _gen_solution_step, SMALL_INSTANCES_NEG)
+    test_positive('test_small_step', _find_duration_step, SMALL_INSTANCES, _verify_size)
+
+
+def _gen_solution_astar(durations, c, T):
+    # the SAT engine answers the same question on the side
+    return gen_solution(durations, c, T, engine='astar', cross_check=True)
+
+
+def _find_duration_astar(durations, c):
+    return find_duration(durations, c, engine='astar')
+
+
+def test_small_astar():
+    test_positive('test_small_astar', _gen_solution_astar, SMALL_INSTANCES)
+    test_negative('test_small_astar', _gen_solution_astar, SMALL_INSTANCES_NEG)
+    test_positive('test_small_astar', _find_duration_astar, SMALL_INSTANCES, _verify_size)
+
+
+def _find_duration_native_card(durations, c):
+    return find_duration(durations, c, engine='sat', card_encoding='native')
+
+
+def _find_duration_maxsat_native_card(durations, c):
+    return find_duration(durations, c, engine='sat', search='maxsat', card_encoding='native')
+
+
+def _find_duration_step_totalizer(durations, c):
+    return find_duration(durations, c, engine='step', card_encoding='totalizer')
+
+
+def test_small_card():
+    # the capacity encoding changes the formula, never the answer
+    test_positive('test_small_card', _find_duration_native_card, SMALL_INSTANCES, _verify_size)
+    test_positive('test_small_card', _find_duration_maxsat_native_card, SMALL_INSTANCES, _verify_size)
+    test_positive('test_small_card', _find_duration_step_totalizer, SMALL_INSTANCES, _verify_size)
+
+
+FAMILIES = {
+    'add_initial_state', 'defines_DEP', 'defines_ARR', 'defines_ALL', 'duration_constraint',
+    'add_arrival_constraints', 'add_boarding_constraints', 'add_alternating_constraints',
+    'add_side_persistence', 'add_location_constraints', 'add_capacity_constraints',
+    'add_departure_duration_link', 'add_movement_constraints', 'add_normal_form', 'add_horizon',
+}
+
+
+def test_small_instrument():
+    # the families account for the whole formula, instrumented or not
+    for durations, c, T in SMALL_INSTANCES + SMALL_INSTANCES_NEG:
+        def builder(**options):
+            return FormulaBuilderSkeleton(speed=durations, durations=durations_of(durations), capacity=c,
+                                          T=T, normal_form='no_idle', **options)
+        plain = builder()
+        plain.build_cnf()
+        counter = CountingSink(CNF())
+        fb = builder(sink=counter, instrument=True)
+        fb.build_cnf()
+        rows = fb.report()
+        clauses = sum(row['clauses'] for row in rows)
+        # the pool starts with the constant false of the pruning
+        variables = sum(row['vars'] for row in rows) + builder().v.top
+        check('test_small_instrument', {row['family'] for row in rows} == FAMILIES,
+              f'Families reported: {sorted(row["family"] for row in rows)}')
+        check('test_small_instrument',
+              clauses == counter.nclauses == len(plain.cnf.clauses)
+              and sum(row['literals'] for row in rows) == counter.nliterals
+              and variables == fb.v.top == plain.v.top,
+              f'{durations=} {c=} {T=}: {clauses} clauses / {variables} vars reported, '
+              f'{counter.nclauses} / {fb.v.top} counted, {len(plain.cnf.clauses)} / {plain.v.top} built')
+
+
+def _gen_solution_preprocessed(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', preprocess=True)
+
+
+def _find_duration_preprocessed(durations, c):
+    return find_duration(durations, c, engine='sat', card_encoding='native', preprocess=True)
+
+
+def _gen_solution_warm(durations, c, T):
+    # starts from the plan without the last chicken
+    plan = gen_solution(durations[:-1], c, T) or []
+    return gen_solution(durations, c, T, engine='sat', warm_start=plan)
+
+
+def _gen_solution_warm_greedy(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', warm_start='greedy')
+
+
+def test_small_warm_start():
+    test_positive('test_small_warm_start', _gen_solution_warm, SMALL_INSTANCES)
+    test_negative('test_small_warm_start', _gen_solution_warm, SMALL_INSTANCES_NEG)
+    test_positive('test_small_warm_start', _gen_solution_warm_greedy, SMALL_INSTANCES)
+    test_negative('test_small_warm_start', _gen_solution_warm_greedy, SMALL_INSTANCES_NEG)
+
+
+WINNERS = []
+
+
+def _gen_solution_portfolio(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', solvers=('cd19', 'g4'), winners=WINNERS)
+
+
+def _find_duration_portfolio(durations, c):
+    return find_duration(durations, c, engine='sat', solvers=('cd19', 'g4'), winners=WINNERS)
+
+
+def _gen_solution_portfolio_native_card(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', card_encoding='native',
+                        solvers=('cd19', 'g4', 'mc', 'gc4'), winners=WINNERS)
+
+
+def test_small_portfolio():
+    test_positive('test_small_portfolio', _gen_solution_portfolio, SMALL_INSTANCES)
+    test_negative('test_small_portfolio', _gen_solution_portfolio, SMALL_INSTANCES_NEG)
+    test_positive('test_small_portfolio', _find_duration_portfolio, SMALL_INSTANCES, _verify_size)
+    check('test_small_portfolio', WINNERS and {winner for _, winner in WINNERS} <= {'cd19', 'g4'},
+          f'Unexpected race winners {WINNERS}')
+
+    # AtMostK constraints : CaDiCaL and Glucose drop out of the race
+    WINNERS.clear()
+    test_positive('test_small_portfolio', _gen_solution_portfolio_native_card, SMALL_INSTANCES)
+    test_negative('test_small_portfolio', _gen_solution_portfolio_native_card, SMALL_INSTANCES_NEG)
+    check('test_small_portfolio', WINNERS and {winner for _, winner in WINNERS} <= {'mc', 'gc4'},
+          f'Backends without AtMostK won a race: {WINNERS}')
+
+    try:
+        gen_solution([1, 2, 5, 10], 2, 17, engine='sat', solvers=('cd19', 'g4'), warm_start='greedy')
+    except ValueError:
+        check('test_small_portfolio', True, '')
+    else:
+        check('test_small_portfolio', False, 'solvers with warm_start was accepted')
+
+
+def _gen_solution_normal_form(normal_form):
+    def gen(durations, c, T):
+        return gen_solution(durations, c, T, engine='sat', normal_form=normal_form)
+    return gen
+
+
+def _find_duration_normal_form(normal_form, incremental=True):
+    def find(durations, c):
+        return find_duration(durations, c, engine='sat', normal_form=normal_form, incremental=incremental)
+    return find
+
+
+def test_small_normal_form():
+    # a horizon with slack past the optimum, the greedy plan (19) does not fit
+    slack = [([1, 2, 5, 10], 2, 18)]
+    for normal_form in ('no_idle', 'slack_end'):
+        gen, find = _gen_solution_normal_form(normal_form), _find_duration_normal_form(normal_form)
+        test_positive('test_small_normal_form', gen, SMALL_INSTANCES + slack)
+        test_negative('test_small_normal_form', gen, SMALL_INSTANCES_NEG)
+        test_positive('test_small_normal_form', find, SMALL_INSTANCES, _verify_size)
+        test_positive('test_small_normal_form', _find_duration_normal_form(normal_form, incremental=False),
+                      SMALL_INSTANCES, _verify_size)
+        # the normal form only drops schedules, never the optimum
+        for durations, c, _ in SMALL_INSTANCES:
+            optimum = find_duration(durations, c)
+            check('test_small_normal_form', find(durations, c) == optimum,
+                  f'{normal_form}: optimum of {durations=} {c=} moved from {optimum}')
+
+
+def _scaled(instances, k):
+    return [([k * d for d in durations], c, k * T) for durations, c, T in instances]
+
+
+def test_small_events():
+    # coarse durations only get a layer every 5 time units
+    test_positive('test_small_events', _gen_solution_sat, _scaled(SMALL_INSTANCES, 5))
+    test_negative('test_small_events', _gen_solution_sat, _scaled(SMALL_INSTANCES_NEG, 5))
+    test_positive('test_small_events', _find_duration_sat, _scaled(SMALL_INSTANCES, 5), _verify_size)
+
+
+def test_small_preprocess():
+    # eliminated auxiliaries are rebuilt before decoding
+    test_positive('test_small_preprocess', _gen_solution_preprocessed, SMALL_INSTANCES)
+    test_negative('test_small_preprocess', _gen_solution_preprocessed, SMALL_INSTANCES_NEG)
+    test_positive('test_small_preprocess', _find_duration_preprocessed, SMALL_INSTANCES, _verify_size)
+
+
+def _gen_solution_budget(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', budget=Budget(seconds=60, conflicts=10 ** 6))
+
+
+def _find_duration_budget(durations, c):
+    return find_duration(durations, c, engine='sat', budget=Budget(seconds=60, conflicts=10 ** 6))
+
+
+def _gen_solution_budget_warm(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', warm_start='greedy',
+                        budget=Budget(seconds=60, conflicts=10 ** 6))
+
+
+def test_small_budget():
+    # enough budget : the same answers
+    test_positive('test_small_budget', _gen_solution_budget, SMALL_INSTANCES)
+    test_negative('test_small_budget', _gen_solution_budget, SMALL_INSTANCES_NEG)
+    test_positive('test_small_budget', _gen_solution_budget_warm, SMALL_INSTANCES)
+    test_negative('test_small_budget', _gen_solution_budget_warm, SMALL_INSTANCES_NEG)
+    test_positive('test_small_budget', _find_duration_budget, SMALL_INSTANCES, _verify_size)
+
+    # a hard horizon is cut off, UNKNOWN comes with bounds around the optimum.
+    # It needs about a minute unbounded, the limits are checked on the
+    # solver counters rather than on the clock of a possibly loaded machine
+    durations, c, optimum = BIG_INSTANCES[0]
+    reports = []
+    calls = {
+        'gen_solution': (Budget(seconds=0.5),
+                         lambda budget: gen_solution(durations, c, optimum - 1, engine='sat', budget=budget)),
+        'find_duration': (Budget(conflicts=500, progress=reports.append),
+                          lambda budget: find_duration(durations, c, engine='sat', budget=budget)),
+        'warm_start': (Budget(seconds=0.5),
+                       lambda budget: gen_solution(durations, c, optimum - 1, engine='sat', warm_start='greedy',
+                                                   budget=budget)),
+        'portfolio': (Budget(conflicts=500),
+                      lambda budget: find_duration(durations, c, engine='sat', solvers=('cd19', 'g4'),
+                                                   budget=budget)),
+    }
+    for name, (budget, call) in calls.items():
+        try:
+            call(budget)
+        except BudgetExceeded as e:
+            check('test_small_budget', e.lo <= optimum <= e.hi,
+                  f'{name}: [{e.lo}, {e.hi}] does not hold the optimum {optimum}')
+            if budget.conflicts is not None:
+                check('test_small_budget', 0 < budget.spent['conflicts'] <= 2 * budget.conflicts,
+                      f'{name}: {budget.spent["conflicts"]} conflicts for a budget of {budget.conflicts}')
+        else:
+            check('test_small_budget', False, f'{name}: no BudgetExceeded')
+    # the solve that runs out of conflicts reports before giving up
+    check('test_small_budget', reports and reports[-1]['conflicts'] > 0, f'No progress reported: {reports}')
+
+
+CACHE = ResultCache()
+
+
+def _gen_solution_cached(durations, c, T):
+    return gen_solution(durations, c, T, cache=CACHE)
+
+
+def _find_duration_cached(durations, c):
+    return find_duration(durations, c, cache=CACHE)
+
+
+def test_small_cache():
+    # the second round is answered from the cache
+    for _ in range(2):
+        test_positive('test_small_cache', _gen_solution_cached, SMALL_INSTANCES)
+        test_negative('test_small_cache', _gen_solution_cached, SMALL_INSTANCES_NEG)
+        test_positive('test_small_cache', _find_duration_cached, SMALL_INSTANCES, _verify_size)
+    # scaled and shuffled copies of the instances
+    scaled = [([3 * d for d in durations[::-1]], c, 3 * T) for durations, c, T in SMALL_INSTANCES]
+    test_positive('test_small_cache', _gen_solution_cached, scaled)
+    test_positive('test_small_cache', _find_duration_cached, scaled, _verify_size)
+    check('test_small_cache', CACHE.stats()['misses'] <= 2 * len(SMALL_INSTANCES) + len(SMALL_INSTANCES_NEG),
+          f'Cache missed too often: {CACHE.stats()}')
+
+    # one A* search gives the optimum and the schedule the cache keeps for it
+    cache = ResultCache()
+    for durations, c, T in SMALL_INSTANCES:
+        optimum = find_duration(durations, c, engine='astar', cache=cache)
+        known, solution = cache.solution(durations, c, T)
+        check('test_small_cache', optimum == T and known and solution is not None,
+              f'No witness cached for {durations=} {c=} {T=}')
+
+    # infeasible for a sub-instance says nothing : the extra fast chickens
+    # row back ([30, 30, 5] needs 65, [2, 30, 5, 30, 2] only 45)
+    cache = ResultCache()
+    test_negative('test_small_cache', lambda durations, c, T: gen_solution(durations, c, T, cache=cache),
+                  [([30, 30, 5], 2, 64)])
+    test_positive('test_small_cache', lambda durations, c, T: gen_solution(durations, c, T, cache=cache),
+                  [([2, 30, 5, 30, 2], 2, 50)])
+
+
+def test_small_batch():
+    # the pool answers the same thing as the serial calls
+    instances = SMALL_INSTANCES + SMALL_INSTANCES_NEG
+    answers = {}
+    for index, status, solution in gen_solutions(instances, workers=2, chunksize=2):
+        durations, c, T = instances[index]
+        answers[(tuple(durations), c, T)] = solution
+    test_positive('test_small_batch', lambda durations, c, T: answers[(tuple(durations), c, T)],
+                  SMALL_INSTANCES)
+    test_negative('test_small_batch', lambda durations, c, T: answers[(tuple(durations), c, T)],
+                  SMALL_INSTANCES_NEG)
+    optimum = {}
+    for index, status, T in find_durations(SMALL_INSTANCES, workers=2):
+        durations, c, _ = SMALL_INSTANCES[index]
+        optimum[(tuple(durations), c)] = T
+    test_positive('test_small_batch', lambda durations, c: optimum[(tuple(durations), c)],
+                  SMALL_INSTANCES, _verify_size)
+
+    # a stuck instance is cut off, the others still come back : the stuck
+    # horizon needs about a minute, a small one well under a second even
+    # on a loaded machine
+    stuck = [(BIG_INSTANCES[0][0], 2, BIG_INSTANCES[0][2] - 1)] + SMALL_INSTANCES
+    statuses = [status for _, status, _ in gen_solutions(stuck, workers=2, timeout=5, engine='sat',
+                                                         ordered=True)]
+    check('test_small_batch', statuses[0] == 'timeout', f'Stuck instance ended with {statuses[0]!r}')
+    check('test_small_batch', statuses[1:] == ['ok'] * len(SMALL_INSTANCES),
+          f'Unexpected batch statuses {statuses}')
+
+    # a budget is per instance : the stuck one runs out, the others still fit in theirs
+    durations, c, optimum = BIG_INSTANCES[0]
+    answers = list(gen_solutions(stuck, workers=2, engine='sat', ordered=True, budget=Budget(conflicts=20_000)))
+    check('test_small_batch', answers[0][1] == 'unknown' and answers[0][2][0] <= optimum <= answers[0][2][1],
+          f'Stuck instance under a budget ended with {answers[0]}')
+    check('test_small_batch', [status for _, status, _ in answers[1:]] == ['ok'] * len(SMALL_INSTANCES),
+          f'Unexpected batch statuses under a budget {answers}')
+
+    # the workers cannot start processes, refused before any of them starts
+    for options in ({'solvers': ('g3', 'cd19')}, {'search': 'parallel'}):
+        try:
+            list(find_durations(SMALL_INSTANCES, workers=2, engine='sat', **options))
+        except ValueError:
+            check('test_small_batch', True, '')
+        else:
+            check('test_small_batch', False, f'{options} accepted by the batch')
+
+
+async def _async_answers(instances):
+    async with Scheduler(workers=2, max_pending=3) as scheduler:
+        solutions = await asyncio.gather(*(scheduler.gen_solution(durations, c, T, engine='sat')
+                                           for durations, c, T in instances))
+        optimums = await asyncio.gather(*(scheduler.find_duration(durations, c, engine='sat')
+                                          for durations, c, _ in instances))
+        # options that take no budget, or not every backend
+        warm = await asyncio.gather(*(scheduler.gen_solution(durations, c, T, engine='sat', warm_start='greedy')
+                                      for durations, c, T in instances))
+        maxsat = await asyncio.gather(*(scheduler.find_duration(durations, c, engine='sat', search='maxsat')
+                                        for durations, c, _ in instances))
+
+        # cancelling the task interrupts the solver of a hard horizon
+        durations, c, T = BIG_INSTANCES[0]
+        stuck = asyncio.create_task(scheduler.gen_solution(durations, c, T - 1, engine='sat'))
+        await asyncio.sleep(0.2)
+        start = time.monotonic()
+        stuck.cancel()
+        try:
+            await stuck
+        except asyncio.CancelledError:
+            pass
+        check('test_small_async', time.monotonic() - start <= 1 and not scheduler.pending,
+              f'Cancelled solve still running after {time.monotonic() - start:.1f}s')
+    return {(tuple(durations), c, T): answer
+            for (durations, c, T), *answer in zip(instances, solutions, optimums, warm, maxsat)}
+
+
+def test_small_async():
+    answers = asyncio.run(_async_answers(SMALL_INSTANCES + SMALL_INSTANCES_NEG))
+    test_positive('test_small_async', lambda durations, c, T: answers[(tuple(durations), c, T)][0],
+                  SMALL_INSTANCES)
+    test_negative('test_small_async', lambda durations, c, T: answers[(tuple(durations), c, T)][0],
+                  SMALL_INSTANCES_NEG)
+    test_positive('test_small_async', lambda durations, c, T: answers[(tuple(durations), c, T)][2],
+                  SMALL_INSTANCES)
+    test_negative('test_small_async', lambda durations, c, T: answers[(tuple(durations), c, T)][2],
+                  SMALL_INSTANCES_NEG)
+    for i in (1, 3):
+        optimum = {(durations, c): answer[i] for (durations, c, _), answer in answers.items()}
+        test_positive('test_small_async', lambda durations, c: optimum[(tuple(durations), c)],
+                      SMALL_INSTANCES, _verify_size)
+
+
+def _cli_answers(instances, **options):
+    lines = [json.dumps({'id': i, 'durations': durations, 'c': c, 'T': T})
+             for i, (durations, c, T) in enumerate(instances)]
+    lines += [json.dumps({'durations': durations, 'c': c}) for durations, c, _ in instances]
+    out = io.StringIO()
+    cli.run(lines + ['{"durations": '], out, **options)
+    by_line = {result['line']: result for result in map(json.loads, out.getvalue().splitlines())}
+    # a bad line is answered too, the stream goes on
+    check('test_small_cli', len(by_line) == len(lines) + 1 and by_line[len(lines) + 1]['status'] == 'error',
+          f'Unexpected CLI output {by_line}')
+    solutions, optimum = {}, {}
+    for i, (durations, c, T) in enumerate(instances):
+        solutions[(tuple(durations), c, T)] = by_line[i + 1].get('schedule')
+        optimum[(tuple(durations), c)] = by_line[len(instances) + i + 1]['optimum']
+    return solutions, optimum
+
+
+def test_small_export():
+    # the event rows are the rows of the full grid where something leaves or lands
+    for durations, c, T in SMALL_INSTANCES:
+        schedule = Schedule.from_solution(gen_solution(durations, c, T),
+                                          dict(enumerate(durations, start=1)), T)
+        grids = []
+        for events_only in (False, True):
+            out = io.StringIO()
+            export_schedule_to_csv(schedule, out, events_only=events_only)
+            grids.append(out.getvalue().splitlines())
+        full, events = grids
+        moves = [row for row in full if ';Move;' in row]
+        check('test_small_export', len(full) == T + 2 and set(moves) <= set(events) <= set(full),
+              f'Bad CSV export of {durations=} {c=} {T=}')
+
+
+ARTIFACTS = tempfile.TemporaryDirectory()
+
+
+def _gen_solution_compiled(durations, c, T):
+    return gen_solution(durations, c, T, engine='sat', artifacts=ARTIFACTS.name)
+
+
+def test_small_artifacts():
+    # compiled by the first round, mapped by the second
+    for _ in range(2):
+        test_positive('test_small_artifacts', _gen_solution_compiled, SMALL_INSTANCES)
+        test_negative('test_small_artifacts', _gen_solution_compiled, SMALL_INSTANCES_NEG)
+    # DIMACS and back, the schedule still decodes
+    for name in os.listdir(ARTIFACTS.name):
+        text = io.StringIO()
+        with artifact.load(os.path.join(ARTIFACTS.name, name)) as formula:
+            artifact.to_dimacs(formula, text)
+            copy = os.path.join(ARTIFACTS.name, 'copy.tmp')
+            artifact.from_dimacs(io.StringIO(text.getvalue()), copy)
+            with artifact.load(copy) as again:
+                check('test_small_artifacts',
+                      list(again.clauses()) == list(formula.clauses()) and again.names() == formula.names()
+                      and artifact.solve_compiled(again)[0] == artifact.solve_compiled(formula)[0],
+                      f'DIMACS round trip of {name} changed the formula')
+            os.unlink(copy)
+    # an AtMostK without literals is trivially true, not an error
+    copy = os.path.join(ARTIFACTS.name, 'empty.tmp')
+    artifact.from_dimacs(io.StringIO('p cnf+ 2 2\n1 2 0\n<= 0\n'), copy)
+    with artifact.load(copy) as formula:
+        check('test_small_artifacts', formula.nvars == 2 and list(formula.atmosts()) == [([], 0)],
+              f'Empty AtMostK read as {list(formula.atmosts())}')
+    os.unlink(copy)
+
+
+def test_small_cli():
+    for options in ({}, {'engine': 'sat', 'workers': 2, 'chunksize': 2, 'ordered': False}):
+        solutions, optimum = _cli_answers(SMALL_INSTANCES + SMALL_INSTANCES_NEG, **options)
+        test_positive('test_small_cli', lambda durations, c, T: solutions[(tuple(durations), c, T)],
+                      SMALL_INSTANCES)
+        test_negative('test_small_cli', lambda durations, c, T: solutions[(tuple(durations), c, T)],
+                      SMALL_INSTANCES_NEG)
+        test_positive('test_small_cli', lambda durations, c: optimum[(tuple(durations), c)],
+                      SMALL_INSTANCES, _verify_size)
+
+
 BIG_INSTANCES = [
     ([1, 3, 6, 8, 2, 10, 4, 12, 15], 2, 52),
 ]
@@ -205,6 +731,27 @@ def main():
     test_basic_Q3()
     test_small_Q3()
     test_big_Q3()
+    print(magenta('\n   ##########   SAT fallback  ##########   \n'))
+    test_small_sat()
+    test_small_witness()
+    test_small_step()
+    test_small_astar()
+    test_small_card()
+    test_small_instrument()
+    test_small_events()
+    test_small_portfolio()
+    test_small_normal_form()
+    test_small_warm_start()
+    test_small_preprocess()
+    test_small_budget()
+    test_small_artifacts()
+    print(magenta('\n   ##########   Result cache  ##########   \n'))
+    test_small_cache()
+    print(magenta('\n   ##########   Batch  ##########   \n'))
+    test_small_batch()
+    test_small_async()
+    test_small_cli()
+    test_small_export()
 
 
 if __name__ == '__main__':
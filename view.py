@@ -1,75 +1,139 @@
+"""
+CSV export of a crossing, one row per time step (or per event).
+
+- export_model_to_csv    from a readable model {("B", p, t): bool, ...}
+- export_schedule_to_csv from a schedule.Schedule (any engine), cheaper
+
+Both write the same 11 columns, stream the rows through a large write
+buffer and take a file name or an open text file. With events_only=True
+only the rows where a trip leaves or lands are written, not every idle tick.
+The model is read once : the keys are grouped by time step first, a row
+never looks at the whole model.
+"""
 import csv
+from collections import defaultdict
 
-def export_model_to_csv(model, T, N, filename="chicken_solution.csv"):
+HEADER = [
+    "Time",
+    "Boat",
+    "Action",
+    "Direction",
+    "Passengers",
+    "Duration",
+    "Arrival T",
+    "# Chickens A",
+    "Chickens at A",
+    "# Chickens B",
+    "Chickens at B"
+]
 
-    with open(filename, mode="w", newline="") as file:
-        writer = csv.writer(file, delimiter=";")
+# write buffer of the exports
+BUFFER = 2 ** 20
 
-        # EXACT header (11 columns)
-        writer.writerow([
-            "Time",
-            "Boat",
-            "Action",
-            "Direction",
-            "Passengers",
-            "Duration",
-            "Arrival T",
-            "# Chickens A",
-            "Chickens at A",
-            "# Chickens B",
-            "Chickens at B"
-        ])
-
-        for t in range(T + 1):
-
-            # Boat
-            side = model.get(("side", t))
-            boat = "Bank A" if side is True else "Bank B" if side is False else ""
-
-            # Chickens
-            at_A, at_B = [], []
-            for p in range(1, N + 1):
-                v = model.get(("B", p, t))
-                if v is True:
-                    at_B.append(str(p))
-                elif v is False:
-                    at_A.append(str(p))
-
-            # Move
-            passengers = []
-            direction = ""
-            for p in range(1, N + 1):
-                if model.get(("dep", t, p, "a")):
-                    passengers.append(str(p))
-                    direction = "A → B"
-                elif model.get(("dep", t, p, "r")):
-                    passengers.append(str(p))
-                    direction = "B → A"
-
-            action = "Move" if passengers else "Wait"
-
-            # Duration
-            durations = [
-                str(k[2]) for k, v in model.items()
-                if v and isinstance(k, tuple) and k[0] == "dur" and k[1] == t
-            ]
-
-            dur_str = ", ".join(durations) if durations else ""
-            arr_str = ", ".join(str(t + int(d)) for d in durations) if durations else ""
-
-            # 🔒 ALWAYS 11 CELLS
-            writer.writerow([
-                t,
-                boat,
-                action,
-                direction,
-                ", ".join(passengers) if passengers else "",
-                dur_str,
-                arr_str,
-                len(at_A),
-                " ".join(at_A),
-                len(at_B),
-                " ".join(at_B)
-            ])
 
+def _write(rows, filename) -> None:
+    if hasattr(filename, "write"):
+        writer = csv.writer(filename, delimiter=";")
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+        return
+    with open(filename, mode="w", newline="", buffering=BUFFER) as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(HEADER)
+        writer.writerows(rows)
     print(f"[INFO] Excel-perfect grid exported to {filename}")
+
+
+def _model_rows(model, T, N, events_only):
+    # t -> what the model says at t, one pass over the model
+    side = {}
+    on_B = defaultdict(dict)
+    leaving = defaultdict(list)
+    durations = defaultdict(list)
+    for key, value in model.items():
+        if not isinstance(key, tuple):
+            continue
+        kind = key[0]
+        if kind == "side":
+            side[key[1]] = value
+        elif kind == "B":
+            on_B[key[2]][key[1]] = value
+        elif kind == "dep" and value:
+            leaving[key[1]].append((key[2], key[3]))
+        elif kind == "dur" and value:
+            durations[key[1]].append(key[2])
+
+    times = range(T + 1)
+    if events_only:
+        arrivals = {t + int(d) for t, ds in durations.items() for d in ds}
+        times = sorted(t for t in {0, *leaving, *arrivals} if t <= T)
+
+    for t in times:
+        boat = "Bank A" if side.get(t) is True else "Bank B" if side.get(t) is False else ""
+
+        # Chickens
+        where = on_B.get(t, {})
+        at_A, at_B = [], []
+        for p in range(1, N + 1):
+            v = where.get(p)
+            if v is True:
+                at_B.append(str(p))
+            elif v is False:
+                at_A.append(str(p))
+
+        # Move
+        passengers = []
+        direction = ""
+        for p, s in sorted(leaving.get(t, ())):
+            if p <= N:
+                passengers.append(str(p))
+                direction = "A → B" if s == "a" else "B → A"
+
+        ds = [str(d) for d in durations.get(t, ())]
+
+        # 🔒 ALWAYS 11 CELLS
+        yield [
+            t,
+            boat,
+            "Move" if passengers else "Wait",
+            direction,
+            ", ".join(passengers),
+            ", ".join(ds),
+            ", ".join(str(t + int(d)) for d in ds),
+            len(at_A),
+            " ".join(at_A),
+            len(at_B),
+            " ".join(at_B)
+        ]
+
+
+def export_model_to_csv(model, T, N, filename="chicken_solution.csv", events_only=False):
+    _write(_model_rows(model, T, N, events_only), filename)
+
+
+def _schedule_rows(schedule, events_only):
+    at = None
+    for state in schedule.states(events_only):
+        # the lists only change when a trip lands
+        if at is None or at[0] is not state.at_A:
+            at = (state.at_A, len(state.at_A), " ".join(map(str, state.at_A)),
+                  len(state.at_B), " ".join(map(str, state.at_B)))
+        trip = state.trip
+        yield [
+            state.t,
+            "Bank A" if state.boat_on_A else "Bank B",
+            "Move" if trip else "Wait",
+            ("A → B" if trip.forward else "B → A") if trip else "",
+            ", ".join(map(str, trip.moving)) if trip else "",
+            trip.duration if trip else "",
+            trip.arrival if trip else "",
+            *at[1:]
+        ]
+
+
+def export_schedule_to_csv(schedule, filename="chicken_solution.csv", events_only=False):
+    """
+    Same grid as export_model_to_csv, from a schedule.Schedule (any engine)
+    instead of a readable model of every variable.
+    """
+    _write(_schedule_rows(schedule, events_only), filename)